@@ -2,11 +2,25 @@
 Simplified Flask Backend for NL2SQL
 Integrated with HTML/CSS/JS Frontend
 No Authentication Required - Local Use Only
+
+Run with a threaded WSGI server so long LLM generations don't block other
+requests (one worker keeps the LLM and FAISS index single-instance):
+    gunicorn -c gunicorn.conf.py app:app
 """
 
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, Response, render_template, jsonify, request, send_from_directory
+from flask_orjson import OrjsonProvider
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+import orjson
+import asyncio
 import os
 import logging
+import threading
 
 # Services
 from services.llm_service import get_llm_service
@@ -14,6 +28,8 @@ from services.rag_service import get_rag_service
 from services.validator import SQLValidator
 from services.schema_service import SchemaService
 from services.query_executor import QueryExecutor
+from services.sql_cache import get_sql_cache, compute_schema_hash
+from utils.rag_helper import build_rag_index_from_schema
 from config import Config
 
 # Configure logging
@@ -29,17 +45,53 @@ app = Flask(__name__,
             template_folder='templates')
 app.config.from_object(Config)
 
+
+def _json_default(obj):
+    """Serialize MySQL result types that orjson doesn't handle natively"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, timedelta):
+        # pymysql returns TIME columns as timedelta
+        return str(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8', errors='replace')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class AppJSONProvider(OrjsonProvider):
+    """orjson-backed JSON provider used by every jsonify() call"""
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    default = staticmethod(_json_default)
+
+
+app.json_provider_class = AppJSONProvider
+app.json = AppJSONProvider(app)
+
 # Initialize services
 schema_service = SchemaService()
 query_executor = QueryExecutor()
 
 # Global state to store connection and RAG index
-APP_STATE = {
-    'connection_params': None,
-    'schema': None,
-    'rag_loaded': False,
-    'connection_id': 1
-}
+@dataclass(slots=True)
+class AppState:
+    connection_params: Optional[Dict] = None
+    schema: Optional[Dict] = None
+    schema_hash: Optional[str] = None
+    validation_schema: Optional[Dict] = None
+    validator: Optional[SQLValidator] = None
+    schema_json: Optional[bytes] = None
+    rag_build_future: Optional[Future] = None
+    rag_loaded: bool = False
+    connection_id: int = 1
+
+
+APP_STATE = AppState()
+
+# Guards APP_STATE mutations when served by a multi-threaded server
+_state_lock = threading.RLock()
+
+# Single worker so RAG index builds never overlap
+_rag_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rag-build')
 
 
 # ============================================
@@ -48,8 +100,8 @@ APP_STATE = {
 
 def get_connection_params():
     """Get stored database connection parameters"""
-    if APP_STATE['connection_params']:
-        return APP_STATE['connection_params']
+    if APP_STATE.connection_params:
+        return APP_STATE.connection_params
 
     # Try to load from config/env if not set
     return {
@@ -61,29 +113,197 @@ def get_connection_params():
     }
 
 
+def dumps_json(obj) -> bytes:
+    """Serialize obj to JSON bytes with the app's orjson options"""
+    return orjson.dumps(obj, option=AppJSONProvider.option, default=_json_default)
+
+
+def json_response(obj, status=200):
+    """Build a JSON Response directly, bypassing jsonify's provider plumbing"""
+    return Response(dumps_json(obj), status=status, mimetype='application/json')
+
+
+def stream_json_rows(rows, meta):
+    """
+    Yield a JSON object built from meta plus a 'results' array of rows
+
+    Rows are serialized one at a time so the full response body is never
+    materialized in memory before the first byte is sent.
+    """
+    # meta always has at least one key, so its closing brace can be swapped
+    # for the results array
+    yield dumps_json(meta)[:-1] + b',"results":['
+    for i, row in enumerate(rows):
+        if i:
+            yield b','
+        yield dumps_json(row)
+    yield b']}'
+
+
+def query_result_response(result, **extra):
+    """Stream a successful QueryExecutor result to the client"""
+    meta = dict(extra)
+    meta.update({
+        'columns': result['columns'],
+        'num_results': result['row_count'],
+        'execution_time': result['execution_time_ms']
+    })
+    return Response(stream_json_rows(result['data'], meta),
+                    mimetype='application/json')
+
+
+def format_schema_for_frontend(schema):
+    """Flatten schema tables/columns into the shape the frontend expects"""
+    return [
+        {
+            'name': table_name,
+            'columns': [
+                {
+                    'name': col['name'],
+                    'type': col['type'],
+                    'is_primary': col.get('is_primary_key', False),
+                    'is_foreign': col.get('is_foreign_key', False),
+                    'nullable': col.get('nullable', True)
+                }
+                for col in table_info['columns']
+            ]
+        }
+        for table_name, table_info in schema['tables'].items()
+    ]
+
+
+def set_schema(schema):
+    """Store schema and everything derived from it; caller holds _state_lock"""
+    APP_STATE.schema = schema
+    APP_STATE.schema_hash = compute_schema_hash(schema)
+    APP_STATE.validation_schema = schema_service.get_schema_for_validation(schema)
+    APP_STATE.validator = SQLValidator(APP_STATE.validation_schema)
+    APP_STATE.schema_json = dumps_json({'schema': format_schema_for_frontend(schema)})
+
+
+@lru_cache(maxsize=512)
+def get_rag_context(natural_query, schema_hash):
+    """
+    Retrieve (schema_context, business_context) for a query
+
+    Memoized per schema_hash; cleared when the RAG index is rebuilt.
+    """
+    return get_rag_service().get_schema_and_business_context(natural_query)
+
+
 def ensure_schema_loaded():
     """Ensure schema is loaded and cached"""
-    if APP_STATE['schema'] is None:
-        connection_params = get_connection_params()
-        APP_STATE['schema'] = schema_service.extract_schema(connection_params)
-        logger.info(f"Schema loaded: {len(APP_STATE['schema']['tables'])} tables")
-    return APP_STATE['schema']
+    with _state_lock:
+        if APP_STATE.schema is None:
+            connection_params = get_connection_params()
+            set_schema(schema_service.extract_schema(connection_params))
+            logger.info(f"Schema loaded: {len(APP_STATE.schema['tables'])} tables")
+        return APP_STATE.schema
+
+
+def build_rag_index(schema, connection_id):
+    """Build and save the RAG index, then mark it loaded (runs on _rag_builder)"""
+    build_rag_index_from_schema(schema, connection_id)
+    get_rag_context.cache_clear()
+    with _state_lock:
+        APP_STATE.rag_loaded = True
+    logger.info("✓ RAG index built and saved")
 
 
 def ensure_rag_loaded():
     """Load RAG index if not already loaded (cached)"""
-    if not APP_STATE['rag_loaded']:
-        rag_service = get_rag_service()
-
-        # Try to load existing index from disk
-        if rag_service.load_index(APP_STATE['connection_id']):
-            logger.info("✓ RAG index loaded from cache")
-            APP_STATE['rag_loaded'] = True
-            return True
-        else:
-            logger.warning("RAG index not found in cache - needs to be built")
+    with _state_lock:
+        future = APP_STATE.rag_build_future
+        if future is not None and not future.done():
+            logger.info("RAG index build still in progress")
             return False
-    return True
+
+        if not APP_STATE.rag_loaded:
+            rag_service = get_rag_service()
+
+            # Try to load existing index from disk
+            if rag_service.load_index(APP_STATE.connection_id):
+                logger.info("✓ RAG index loaded from cache")
+                APP_STATE.rag_loaded = True
+                return True
+            else:
+                logger.warning("RAG index not found in cache - needs to be built")
+                return False
+        return True
+
+
+def rag_not_loaded_response():
+    """
+    Response for a query that arrived before the RAG index is usable
+
+    While a background build is running this is a 503 pointing at
+    /api/rag/status, so clients wait instead of queueing another rebuild;
+    otherwise a 400 telling the client to build the index first.
+    """
+    future = APP_STATE.rag_build_future
+    if future is not None and not future.done():
+        return json_response({
+            'error': 'RAG index is still being built. Poll /api/rag/status and retry.',
+            'status': 'building'
+        }, 503)
+
+    return json_response({
+        'error': 'RAG index not loaded. Please refresh schema first.',
+        'needs_refresh': True
+    }, 400)
+
+
+def lookup_cached_sql(natural_query, schema_hash):
+    """
+    Reuse SQL generated for the same or a near-identical question
+
+    Returns (sql, query_embedding); sql is None on a cache miss, and the
+    embedding is kept so the miss can be stored without re-embedding.
+    """
+    sql_cache = get_sql_cache()
+    generated_sql = sql_cache.get(schema_hash, natural_query)
+    if generated_sql is not None:
+        return generated_sql, None
+
+    query_embedding = get_rag_service().embed_query(natural_query)
+    return sql_cache.get_similar(schema_hash, query_embedding), query_embedding
+
+
+def generate_sql_for_query(natural_query, schema_hash):
+    """Retrieve RAG context and generate SQL for a single question"""
+    schema_context, business_context = get_rag_context(natural_query, schema_hash)
+    return get_llm_service().generate_sql(
+        natural_query,
+        schema_context,
+        business_context
+    )
+
+
+def validate_and_cache_sql(natural_query, generated_sql, schema_hash, query_embedding, cache_miss):
+    """Validate generated SQL and cache it if it was freshly generated and valid"""
+    is_valid, errors = APP_STATE.validator.validate(generated_sql)
+    if is_valid and cache_miss:
+        get_sql_cache().put(schema_hash, natural_query, generated_sql, query_embedding)
+    return is_valid, errors
+
+
+def invalid_sql_response(generated_sql, errors):
+    """400 response for SQL that failed validation"""
+    return json_response({
+        'sql': generated_sql,
+        'valid': False,
+        'errors': errors
+    }, 400)
+
+
+def generated_sql_response(result, generated_sql):
+    """Stream a successful execution, or report the execution error"""
+    if result['success']:
+        return query_result_response(result, sql=generated_sql)
+    return json_response({
+        'sql': generated_sql,
+        'error': result['error']
+    }, 400)
 
 
 # ============================================
@@ -111,8 +331,8 @@ def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'rag_loaded': APP_STATE['rag_loaded'],
-        'schema_loaded': APP_STATE['schema'] is not None
+        'rag_loaded': APP_STATE.rag_loaded,
+        'schema_loaded': APP_STATE.schema is not None
     })
 
 
@@ -122,67 +342,69 @@ def connect_database():
     try:
         data = request.get_json()
 
-        # Store connection parameters
-        APP_STATE['connection_params'] = {
-            'host': data.get('host', 'localhost'),
-            'port': data.get('port', 3306),
-            'user': data['username'],
-            'password': data['password'],
-            'database': data['database']
-        }
+        with _state_lock:
+            # Store connection parameters
+            APP_STATE.connection_params = {
+                'host': data.get('host', 'localhost'),
+                'port': data.get('port', 3306),
+                'user': data['username'],
+                'password': data['password'],
+                'database': data['database']
+            }
 
-        # Test connection
-        success, message = schema_service.test_connection(APP_STATE['connection_params'])
-        if not success:
-            return jsonify({'error': message}), 400
+            # Drop pooled connections opened with previous credentials, so
+            # the test below really checks the submitted ones
+            query_executor.dispose_pool(APP_STATE.connection_params)
 
-        # Extract schema
-        APP_STATE['schema'] = schema_service.extract_schema(APP_STATE['connection_params'])
+            # Test connection
+            success, message = schema_service.test_connection(APP_STATE.connection_params)
+            if not success:
+                return jsonify({'error': message}), 400
 
-        # Build RAG index (this creates and saves it)
-        from utils.rag_helper import build_rag_index_from_schema
-        build_rag_index_from_schema(APP_STATE['schema'], APP_STATE['connection_id'])
-        APP_STATE['rag_loaded'] = True
+            # Extract schema
+            set_schema(schema_service.extract_schema(APP_STATE.connection_params))
 
-        logger.info(f"✓ Connected to {data['database']} with {len(APP_STATE['schema']['tables'])} tables")
-        logger.info("✓ RAG index built and saved")
+            # Build RAG index in the background; clients poll /api/rag/status
+            APP_STATE.rag_loaded = False
+            APP_STATE.rag_build_future = _rag_builder.submit(
+                build_rag_index, APP_STATE.schema, APP_STATE.connection_id
+            )
 
-        return jsonify({
-            'message': 'Connected successfully',
-            'tables': len(APP_STATE['schema']['tables'])
-        })
+            logger.info(f"✓ Connected to {data['database']} with {len(APP_STATE.schema['tables'])} tables")
+
+            return jsonify({
+                'message': 'Connected successfully, building RAG index',
+                'status': 'building',
+                'tables': len(APP_STATE.schema['tables'])
+            }), 202
 
     except Exception as e:
         logger.error(f"Connection error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/rag/status', methods=['GET'])
+def rag_status():
+    """Report progress of the background RAG index build"""
+    future = APP_STATE.rag_build_future
+    if future is None:
+        status = 'ready' if APP_STATE.rag_loaded else 'idle'
+    elif not future.done():
+        status = 'building'
+    elif future.exception() is not None:
+        return jsonify({'status': 'failed', 'error': str(future.exception())})
+    else:
+        status = 'ready'
+
+    return jsonify({'status': status})
+
+
 @app.route('/api/schema', methods=['GET'])
 def get_schema():
     """Get database schema"""
     try:
-        schema = ensure_schema_loaded()
-
-        # Format schema for frontend
-        formatted_schema = []
-        for table_name, table_info in schema['tables'].items():
-            table_data = {
-                'name': table_name,
-                'columns': []
-            }
-
-            for col in table_info['columns']:
-                table_data['columns'].append({
-                    'name': col['name'],
-                    'type': col['type'],
-                    'is_primary': col.get('is_primary_key', False),
-                    'is_foreign': col.get('is_foreign_key', False),
-                    'nullable': col.get('nullable', True)
-                })
-
-            formatted_schema.append(table_data)
-
-        return jsonify({'schema': formatted_schema})
+        ensure_schema_loaded()
+        return Response(APP_STATE.schema_json, mimetype='application/json')
 
     except Exception as e:
         logger.error(f"Schema fetch error: {str(e)}")
@@ -193,22 +415,32 @@ def get_schema():
 def refresh_schema():
     """Refresh schema and rebuild RAG index"""
     try:
-        connection_params = get_connection_params()
-
-        # Invalidate cache and re-extract
-        schema_service.invalidate_cache(connection_params)
-        APP_STATE['schema'] = schema_service.extract_schema(connection_params)
-
-        # Rebuild RAG index
-        from utils.rag_helper import build_rag_index_from_schema
-        build_rag_index_from_schema(APP_STATE['schema'], APP_STATE['connection_id'])
-        APP_STATE['rag_loaded'] = True
+        with _state_lock:
+            connection_params = get_connection_params()
+
+            # Invalidate cache and re-extract
+            schema_service.invalidate_cache(connection_params)
+            query_executor.dispose_pool(connection_params)
+            set_schema(schema_service.extract_schema(connection_params))
+            get_sql_cache().clear()
+            get_rag_context.cache_clear()
+
+            # Rebuild RAG index (queued behind any build started by /api/connect)
+            APP_STATE.rag_loaded = False
+            future = _rag_builder.submit(
+                build_rag_index, APP_STATE.schema, APP_STATE.connection_id
+            )
+            APP_STATE.rag_build_future = future
+            num_tables = len(APP_STATE.schema['tables'])
+
+        # Wait outside the lock so other requests aren't blocked by the build
+        future.result()
 
         logger.info("✓ Schema refreshed and RAG index rebuilt")
 
         return jsonify({
             'message': 'Schema refreshed successfully',
-            'tables': len(APP_STATE['schema']['tables'])
+            'tables': num_tables
         })
 
     except Exception as e:
@@ -224,62 +456,173 @@ def process_query():
         natural_query = data.get('query', '').strip()
 
         if not natural_query:
-            return jsonify({'error': 'Query cannot be empty'}), 400
+            return json_response({'error': 'Query cannot be empty'}, 400)
 
         # Ensure schema and RAG are loaded
-        schema = ensure_schema_loaded()
+        ensure_schema_loaded()
         if not ensure_rag_loaded():
-            return jsonify({
-                'error': 'RAG index not loaded. Please refresh schema first.',
-                'needs_refresh': True
-            }), 400
-
-        # Get context from RAG
-        rag_service = get_rag_service()
-        schema_context = rag_service.get_schema_context(natural_query)
-        business_context = rag_service.get_business_context(natural_query)
-
-        # Generate SQL
-        llm_service = get_llm_service()
-        generated_sql = llm_service.generate_sql(
-            natural_query,
-            schema_context,
-            business_context
-        )
+            return rag_not_loaded_response()
 
-        # Validate SQL
-        validation_schema = schema_service.get_schema_for_validation(schema)
-        validator = SQLValidator(validation_schema)
-        is_valid, errors = validator.validate(generated_sql)
+        schema_hash = APP_STATE.schema_hash
+        generated_sql, query_embedding = lookup_cached_sql(natural_query, schema_hash)
+
+        cache_miss = generated_sql is None
+        if cache_miss:
+            generated_sql = generate_sql_for_query(natural_query, schema_hash)
 
+        # Validate SQL
+        is_valid, errors = validate_and_cache_sql(
+            natural_query, generated_sql, schema_hash, query_embedding, cache_miss
+        )
         if not is_valid:
-            return jsonify({
-                'sql': generated_sql,
-                'valid': False,
-                'errors': errors
-            }), 400
+            return invalid_sql_response(generated_sql, errors)
 
         # Execute SQL
         connection_params = get_connection_params()
         result = query_executor.execute_query(connection_params, generated_sql)
-
-        if result['success']:
-            return jsonify({
-                'sql': generated_sql,
-                'results': result['data'],
-                'columns': result['columns'],
-                'num_results': result['row_count'],
-                'execution_time': result['execution_time_ms']
-            })
-        else:
-            return jsonify({
-                'sql': generated_sql,
-                'error': result['error']
-            }), 400
+        return generated_sql_response(result, generated_sql)
 
     except Exception as e:
         logger.error(f"Query processing error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
+
+
+@app.route('/api/query/async', methods=['POST'])
+async def process_query_async():
+    """
+    Async variant of /api/query
+
+    Blocking stages (retrieval, LLM generation, DB execution) run in worker
+    threads so the server can overlap them across concurrent requests.
+    LLM calls are still serialized by llm_service's model lock.
+    """
+    try:
+        data = request.get_json()
+        natural_query = data.get('query', '').strip()
+
+        if not natural_query:
+            return json_response({'error': 'Query cannot be empty'}, 400)
+
+        # Ensure schema and RAG are loaded
+        await asyncio.to_thread(ensure_schema_loaded)
+        if not await asyncio.to_thread(ensure_rag_loaded):
+            return rag_not_loaded_response()
+
+        schema_hash = APP_STATE.schema_hash
+        generated_sql, query_embedding = await asyncio.to_thread(
+            lookup_cached_sql, natural_query, schema_hash
+        )
+
+        cache_miss = generated_sql is None
+        if cache_miss:
+            generated_sql = await asyncio.to_thread(
+                generate_sql_for_query, natural_query, schema_hash
+            )
+
+        # Validate SQL
+        is_valid, errors = validate_and_cache_sql(
+            natural_query, generated_sql, schema_hash, query_embedding, cache_miss
+        )
+        if not is_valid:
+            return invalid_sql_response(generated_sql, errors)
+
+        # Execute SQL
+        connection_params = get_connection_params()
+        result = await asyncio.to_thread(
+            query_executor.execute_query, connection_params, generated_sql
+        )
+        return generated_sql_response(result, generated_sql)
+
+    except Exception as e:
+        logger.error(f"Async query processing error: {str(e)}")
+        return json_response({'error': str(e)}, 500)
+
+
+@app.route('/api/query/batch', methods=['POST'])
+def process_query_batch():
+    """Generate and execute SQL for several natural language queries at once"""
+    try:
+        data = request.get_json()
+        queries = data.get('queries', [])
+
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            return json_response({'error': 'Queries must be a list of strings'}, 400)
+
+        natural_queries = [q.strip() for q in queries if q.strip()]
+
+        if not natural_queries:
+            return json_response({'error': 'Queries cannot be empty'}, 400)
+        if len(natural_queries) > Config.MAX_BATCH_QUERIES:
+            return json_response({
+                'error': f"Too many queries: {len(natural_queries)} "
+                         f"(max allowed: {Config.MAX_BATCH_QUERIES})"
+            }, 400)
+
+        # Ensure schema and RAG are loaded
+        ensure_schema_loaded()
+        if not ensure_rag_loaded():
+            return rag_not_loaded_response()
+
+        schema_hash = APP_STATE.schema_hash
+        lookups = [lookup_cached_sql(q, schema_hash) for q in natural_queries]
+        generated_sqls = [generated_sql for generated_sql, _ in lookups]
+        misses = [i for i, generated_sql in enumerate(generated_sqls) if generated_sql is None]
+
+        if misses:
+            # Get context from RAG
+            miss_queries = [natural_queries[i] for i in misses]
+            contexts = [get_rag_context(q, schema_hash) for q in miss_queries]
+            schema_contexts = [schema_context for schema_context, _ in contexts]
+            business_contexts = [business_context for _, business_context in contexts]
+
+            # Generate SQL for the cache misses in one model session
+            llm_service = get_llm_service()
+            miss_sqls = llm_service.generate_sql_batch(
+                miss_queries,
+                schema_contexts,
+                business_contexts
+            )
+            for i, generated_sql in zip(misses, miss_sqls):
+                generated_sqls[i] = generated_sql
+
+        # Validate all SQL at once, caching freshly generated valid SQL
+        validations = APP_STATE.validator.validate_batch(generated_sqls)
+        sql_cache = get_sql_cache()
+        for i in misses:
+            if validations[i][0]:
+                sql_cache.put(schema_hash, natural_queries[i], generated_sqls[i], lookups[i][1])
+
+        connection_params = get_connection_params()
+
+        responses = []
+        for natural_query, generated_sql, (is_valid, errors) in zip(
+            natural_queries, generated_sqls, validations
+        ):
+            item = {'query': natural_query, 'sql': generated_sql}
+
+            if not is_valid:
+                item.update({'valid': False, 'errors': errors})
+                responses.append(item)
+                continue
+
+            # Execute SQL
+            result = query_executor.execute_query(connection_params, generated_sql)
+            if result['success']:
+                item.update({
+                    'results': result['data'],
+                    'columns': result['columns'],
+                    'num_results': result['row_count'],
+                    'execution_time': result['execution_time_ms']
+                })
+            else:
+                item['error'] = result['error']
+            responses.append(item)
+
+        return json_response({'results': responses})
+
+    except Exception as e:
+        logger.error(f"Batch query processing error: {str(e)}")
+        return json_response({'error': str(e)}, 500)
 
 
 @app.route('/api/execute-sql', methods=['POST'])
@@ -290,70 +633,67 @@ def execute_sql():
         sql = data.get('sql', '').strip()
 
         if not sql:
-            return jsonify({'error': 'SQL cannot be empty'}), 400
+            return json_response({'error': 'SQL cannot be empty'}, 400)
 
         # Validate SQL
-        schema = ensure_schema_loaded()
-        validation_schema = schema_service.get_schema_for_validation(schema)
-        validator = SQLValidator(validation_schema)
+        ensure_schema_loaded()
+        validator = APP_STATE.validator
         is_valid, errors = validator.validate(sql)
 
         if not is_valid:
-            return jsonify({
+            return json_response({
                 'error': 'SQL validation failed',
                 'validation_errors': errors
-            }), 400
+            }, 400)
 
         # Execute SQL
         connection_params = get_connection_params()
         result = query_executor.execute_query(connection_params, sql)
 
         if result['success']:
-            return jsonify({
-                'results': result['data'],
-                'columns': result['columns'],
-                'num_results': result['row_count'],
-                'execution_time': result['execution_time_ms']
-            })
+            return query_result_response(result)
         else:
-            return jsonify({'error': result['error']}), 400
+            return json_response({'error': result['error']}, 400)
 
     except Exception as e:
         logger.error(f"SQL execution error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return json_response({'error': str(e)}, 500)
+
+
+# Static payload, serialized once at import
+EXAMPLE_QUERIES = [
+    {
+        'query': 'Show me all customers from USA',
+        'category': 'Basic'
+    },
+    {
+        'query': 'What are the top 5 products by quantity in stock?',
+        'category': 'Aggregation'
+    },
+    {
+        'query': 'List all employees and their managers',
+        'category': 'Joins'
+    },
+    {
+        'query': 'Find customers with credit limit greater than 50000',
+        'category': 'Filtering'
+    },
+    {
+        'query': 'Show me total sales by product line',
+        'category': 'Aggregation'
+    },
+    {
+        'query': 'Which orders are still in process?',
+        'category': 'Filtering'
+    }
+]
+_EXAMPLES_JSON = orjson.dumps({'examples': EXAMPLE_QUERIES})
 
 
 @app.route('/api/examples', methods=['GET'])
 def get_examples():
     """Get example queries"""
-    examples = [
-        {
-            'query': 'Show me all customers from USA',
-            'category': 'Basic'
-        },
-        {
-            'query': 'What are the top 5 products by quantity in stock?',
-            'category': 'Aggregation'
-        },
-        {
-            'query': 'List all employees and their managers',
-            'category': 'Joins'
-        },
-        {
-            'query': 'Find customers with credit limit greater than 50000',
-            'category': 'Filtering'
-        },
-        {
-            'query': 'Show me total sales by product line',
-            'category': 'Aggregation'
-        },
-        {
-            'query': 'Which orders are still in process?',
-            'category': 'Filtering'
-        }
-    ]
-
-    return jsonify({'examples': examples})
+    return Response(_EXAMPLES_JSON, mimetype='application/json')
 
 
 # ============================================
@@ -372,17 +712,20 @@ def initialize_app():
         logger.error("Please download the model first")
         return False
 
-    # Initialize LLM service
-    try:
-        llm_service = get_llm_service()
-        if llm_service.validate_model_loaded():
-            logger.info("✓ LLM service initialized")
-        else:
-            logger.error("❌ LLM service failed to initialize")
+    # Initialize LLM service (otherwise loaded on the first query)
+    if Config.PRELOAD_LLM:
+        try:
+            llm_service = get_llm_service()
+            if llm_service.validate_model_loaded():
+                logger.info("✓ LLM service initialized")
+            else:
+                logger.error("❌ LLM service failed to initialize")
+                return False
+        except Exception as e:
+            logger.error(f"❌ LLM initialization error: {str(e)}")
             return False
-    except Exception as e:
-        logger.error(f"❌ LLM initialization error: {str(e)}")
-        return False
+    else:
+        logger.info("LLM will be loaded on first query (set PRELOAD_LLM=1 to preload)")
 
     # Try to load existing RAG index (if available)
     try:
@@ -408,10 +751,13 @@ def initialize_app():
 
 if __name__ == '__main__':
     if initialize_app():
+        # Development server only; use gunicorn (see module docstring) for
+        # concurrent request handling
         app.run(
             host='127.0.0.1',
             port=5000,
-            debug=True
+            debug=True,
+            threaded=True
         )
     else:
         logger.error("Failed to initialize application")
\ No newline at end of file
@@ -20,18 +20,41 @@ class Config:
     LLM_GPU_LAYERS = int(os.getenv('LLM_GPU_LAYERS', 28))  # Adjust for 128MB VRAM
     LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', 0.1))
     LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', 1000))
+    LLM_THREADS = int(os.getenv('LLM_THREADS', 0))  # 0 = physical core count
+    LLM_BATCH_SIZE = int(os.getenv('LLM_BATCH_SIZE', 1024))
+    LLM_USE_MMAP = os.getenv('LLM_USE_MMAP', '1') == '1'
+    LLM_USE_MLOCK = os.getenv('LLM_USE_MLOCK', '1') == '1'
+    LLM_PIN_THREADS = os.getenv('LLM_PIN_THREADS', '0') == '1'
+    PRELOAD_LLM = os.getenv('PRELOAD_LLM', '0') == '1'
 
     # RAG Configuration
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "./data/faiss_index")
     RAG_TOP_K = int(os.getenv("RAG_TOP_K", 3))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 128))
+    EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "")  # "int8" on CPU
+
+    # Generated SQL Cache
+    SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", 512))
+    SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", 0.95))
+
+    # Query Connection Pool
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+    DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 8))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+    # Query Result Cache
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 512))
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 60))
 
     # Query Constraints
     MAX_QUERY_ROWS = int(os.getenv("MAX_QUERY_ROWS", 1000))
     QUERY_TIMEOUT = int(os.getenv("QUERY_TIMEOUT", 30))
     MAX_JOINS = int(os.getenv("MAX_JOINS", 3))
     MAX_SUBQUERY_DEPTH = int(os.getenv("MAX_SUBQUERY_DEPTH", 3))
+    MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", 8))
 
     # Schema Cache
     SCHEMA_CACHE_DIR = os.getenv("SCHEMA_CACHE_DIR", "./data/schema_cache")
     SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", 3600))  # 1 hour
+    SCHEMA_COLLECT_STATS = os.getenv('SCHEMA_COLLECT_STATS', '0') == '1'
@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration for NL2SQL
+Usage: gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = os.getenv('BIND', '127.0.0.1:5000')
+
+# A single worker keeps one copy of the LLM and FAISS index in memory;
+# threads give request-level concurrency (llama.cpp releases the GIL
+# during inference)
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# LLM generation can take well beyond gunicorn's 30s default
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 300))
+
+
+def post_worker_init(worker):
+    """Load the LLM and cached RAG index before serving requests"""
+    from app import initialize_app
+    initialize_app()
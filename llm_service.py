@@ -1,15 +1,127 @@
-from llama_cpp import Llama
 import os
+import re
+import psutil
+import threading
+from typing import List
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# PostgreSQL -> MySQL rewrites, merged into one alternation so the SQL is
+# scanned once per call
+_PG_SYNTAX_RE = re.compile(
+    r'(?P<ilike>\bILIKE\b)'
+    r'|(?P<nulls>\s+NULLS\s+(?:LAST|FIRST)\b)'
+    r'|(?P<cast_expr>\w+)::(?P<cast_type>INTEGER|TEXT)',
+    re.IGNORECASE
+)
+_MYSQL_CAST_TYPES = {'INTEGER': 'SIGNED', 'TEXT': 'CHAR'}
+
+# Markdown fences and line comments stripped from model output
+_SQL_FENCE_RE = re.compile(r'```sql(.*?)(?:```|\Z)', re.DOTALL)
+_FENCE_RE = re.compile(r'```(.*?)(?:```|\Z)', re.DOTALL)
+_SQL_COMMENT_RE = re.compile(r'--[^\n]*')
+
+# A llama.cpp context is not reentrant; serialize every call into the model
+_llm_lock = threading.Lock()
+
+
+def _rewrite_pg_syntax(match: re.Match) -> str:
+    """Replacement callback for _PG_SYNTAX_RE"""
+    if match.group('ilike'):
+        # MySQL LIKE is case-insensitive by default
+        return 'LIKE'
+    if match.group('nulls'):
+        # MySQL has no NULLS LAST / NULLS FIRST
+        return ''
+    cast_type = _MYSQL_CAST_TYPES[match.group('cast_type').upper()]
+    return f"CAST({match.group('cast_expr')} AS {cast_type})"
+
+
+# Invariant part of the SQLCoder prompt. Kept as the leading block of every
+# prompt so the evaluated tokens can be reused between generate_sql calls.
+STATIC_PROMPT_PREFIX = """### Critical MySQL Syntax Rules
+1. Use ONLY MySQL-compatible syntax
+2. DO NOT use PostgreSQL syntax like ILIKE, NULLS LAST, NULLS FIRST
+3. For case-insensitive search: Use LIKE (MySQL is case-insensitive by default)
+4. For ordering with nulls: Use IS NULL conditions in ORDER BY
+5. DO NOT mix columns from different tables without proper JOINs
+6. Always qualify column names with table aliases when using JOINs
+7. Use only columns that exist in the specified table
+
+### MySQL Syntax Examples
+-- Case-insensitive search (MySQL default):
+SELECT * FROM customers WHERE country LIKE '%USA%';
+
+-- NOT: SELECT * FROM customers WHERE country ILIKE '%USA%';
+
+-- Ordering with nulls:
+SELECT * FROM employees ORDER BY reportsTo IS NULL, reportsTo;
+
+-- NOT: SELECT * FROM employees ORDER BY reportsTo NULLS LAST;
+
+-- Proper JOIN with qualified columns:
+SELECT e.firstName, e.lastName, o.city 
+FROM employees e 
+JOIN offices o ON e.officeCode = o.officeCode;
+
+-- NOT: SELECT e.firstName, e.lastName, o.city, e.customerName 
+-- (customerName is not in employees table!)
+
+### Important Column Rules
+- customers table has: customerNumber, customerName, contactLastName, contactFirstName, phone, addressLine1, addressLine2, city, state, postalCode, country, salesRepEmployeeNumber, creditLimit
+- employees table has: employeeNumber, lastName, firstName, extension, email, officeCode, reportsTo, jobTitle
+- products table has: productCode, productName, productLine, productScale, productVendor, productDescription, quantityInStock, buyPrice, MSRP
+- orders table has: orderNumber, orderDate, requiredDate, shippedDate, status, comments, customerNumber
+- DO NOT use columns from one table in another table's query without JOIN
+
+### Instructions
+- Generate ONLY MySQL-compatible SELECT queries
+- Use proper table and column names from the schema below
+- Include appropriate JOINs when accessing multiple tables
+- Use WHERE clauses for filtering
+- Add GROUP BY for aggregations
+- Use ORDER BY for sorting (without NULLS LAST/FIRST)
+- Use LIMIT for row limiting
+- Ensure all columns used exist in the tables specified
+- When joining tables, use table aliases and qualify all column names
+- Use LIKE for pattern matching (not ILIKE)
+
+"""
+
+# Fixed fragments around the per-request values, pre-concatenated at import
+# so a prompt is a single join of at most seven pieces
+_PROMPT_HEAD = (
+    STATIC_PROMPT_PREFIX
+    + "### Task\nGenerate a MySQL query to answer the following question: `"
+)
+_PROMPT_SCHEMA = (
+    "`\n\n### Database Schema\n"
+    "The query will run on a MySQL database with the following schema:\n"
+)
+_PROMPT_BUSINESS = "\n\n### Business Context\n"
+_PROMPT_SQL = "\n\n### SQL Query\n```sql\n"
+
+# Schema-first layout for callers whose schema never changes between calls:
+# the static prefix plus the schema is then a common token prefix, so only
+# the question is prefilled after the first call
+_PROMPT_SCHEMA_HEAD = (
+    STATIC_PROMPT_PREFIX
+    + "### Database Schema\n"
+    "The query will run on a MySQL database with the following schema:\n"
+)
+_PROMPT_TASK = (
+    "\n\n### Task\n"
+    "Generate a MySQL query to answer the following question: `"
+)
+
 
 class LLMService:
     def __init__(self):
         self.model = None
         self.model_path = Config.LLM_MODEL_PATH
+        self._prefix_token_len = 0
         self._initialize_model()
 
     def _initialize_model(self):
@@ -23,23 +135,70 @@ class LLMService:
 
             logger.info(f"Loading SQLCoder model from {self.model_path}")
 
+            # Imported here so importing this module doesn't load llama.cpp
+            from llama_cpp import Llama
+
+            n_threads = self._configure_threads()
+
             self.model = Llama(
                 model_path=self.model_path,
                 n_ctx=Config.LLM_CONTEXT_SIZE,
                 n_gpu_layers=Config.LLM_GPU_LAYERS,  # Optimized for 128MB VRAM
-                n_batch=512,
-                n_threads=4,
+                n_batch=Config.LLM_BATCH_SIZE,
+                n_threads=n_threads,
+                n_threads_batch=n_threads,
+                use_mmap=Config.LLM_USE_MMAP,
+                use_mlock=Config.LLM_USE_MLOCK,  # Keep weights resident between requests
+                offload_kqv=True,
                 verbose=False
             )
 
             logger.info("SQLCoder model loaded successfully")
 
+            self._warm_prefix_cache()
+
         except Exception as e:
             logger.error(f"Failed to load SQLCoder model: {str(e)}")
             raise
 
+    def _configure_threads(self) -> int:
+        """
+        Pick the llama.cpp thread count (physical cores unless configured)
+
+        Hyperthreads share FPUs, so matmul-heavy prefill scales with
+        physical cores. With LLM_PIN_THREADS the process is pinned to the
+        first n cores to keep threads on one socket.
+        """
+        n_threads = Config.LLM_THREADS
+        if n_threads <= 0:
+            n_threads = psutil.cpu_count(logical=False) or os.cpu_count() or 4
+
+        if Config.LLM_PIN_THREADS and hasattr(os, 'sched_setaffinity'):
+            available = sorted(os.sched_getaffinity(0))
+            os.sched_setaffinity(0, available[:n_threads])
+
+        logger.info(f"Using {n_threads} llama.cpp threads")
+        return n_threads
+
+    def _warm_prefix_cache(self):
+        """
+        Evaluate the static prompt prefix once so its KV state stays resident.
+
+        llama.cpp reuses the longest common token prefix with the previously
+        evaluated sequence, so later calls only prefill the dynamic tail.
+        """
+        try:
+            prefix_tokens = self.model.tokenize(STATIC_PROMPT_PREFIX.encode('utf-8'))
+            with _llm_lock:
+                self.model.reset()
+                self.model.eval(prefix_tokens)
+            self._prefix_token_len = len(prefix_tokens)
+            logger.info(f"Prompt prefix cached ({self._prefix_token_len} tokens)")
+        except Exception as e:
+            logger.warning(f"Prompt prefix warm-up skipped: {str(e)}")
+
     def generate_sql(self, natural_query: str, schema_context: str,
-                     business_context: str = "") -> str:
+                     business_context: str = "", schema_first: bool = False) -> str:
         """
         Generate SQL query from natural language using SQLCoder
 
@@ -47,28 +206,30 @@ class LLMService:
             natural_query: Natural language question
             schema_context: Database schema information from RAG
             business_context: Business logic and domain knowledge
+            schema_first: Put the schema ahead of the question, for callers
+                that pass the same fixed schema on every call (its tokens
+                are then reused from the KV cache)
 
         Returns:
             Generated SQL query
         """
         try:
             # Construct prompt for SQLCoder
-            prompt = self._build_prompt(natural_query, schema_context, business_context)
+            if schema_first:
+                prompt = self._build_schema_first_prompt(
+                    natural_query, schema_context, business_context
+                )
+            else:
+                prompt = self._build_prompt(natural_query, schema_context, business_context)
 
-            print("prompt: " + prompt)
+            logger.debug("Prompt length: %d chars", len(prompt))
 
             # Generate SQL
-            response = self.model(
-                prompt,
-                max_tokens=Config.LLM_MAX_TOKENS,
-                temperature=Config.LLM_TEMPERATURE,
-                top_p=0.95,
-                stop=["</s>", ";", "\n\n"],
-                echo=False
-            )
+            with _llm_lock:
+                completion = self._complete(prompt)
 
             # Extract SQL from response
-            sql_query = self._extract_sql(response['choices'][0]['text'])
+            sql_query = self._extract_sql(completion)
 
             return sql_query.strip()
 
@@ -76,105 +237,100 @@ class LLMService:
             logger.error(f"SQL generation failed: {str(e)}")
             raise
 
-    def _build_prompt(self, question: str, schema: str, business_context: str) -> str:
-        """
-        Build SQLCoder-specific prompt optimized for MySQL
-
-        SQLCoder expects a specific format with schema and question
+    def generate_sql_batch(self, natural_queries: List[str],
+                           schema_contexts: List[str],
+                           business_contexts: List[str] = None,
+                           schema_first: bool = False) -> List[str]:
         """
-        prompt = f"""### Task
-Generate a MySQL query to answer the following question: `{question}`
+        Generate SQL for several natural language queries in one model session
 
-### Database Schema
-The query will run on a MySQL database with the following schema:
-{schema}
+        The model lock is taken once for the whole batch and prompts are run
+        back to back, so every prompt after the first only prefills the part
+        that differs from the shared static prefix.
 
-"""
+        Args:
+            natural_queries: Natural language questions
+            schema_contexts: Schema context for each question
+            business_contexts: Optional business context for each question
+            schema_first: As for generate_sql; worthwhile when every
+                question shares the same schema context
 
-        if business_context:
-            prompt += f"""### Business Context
-{business_context}
+        Returns:
+            Generated SQL queries, in input order
+        """
+        if business_contexts is None:
+            business_contexts = [""] * len(natural_queries)
 
-"""
+        build_prompt = self._build_schema_first_prompt if schema_first else self._build_prompt
 
-        prompt += """### Critical MySQL Syntax Rules
-1. Use ONLY MySQL-compatible syntax
-2. DO NOT use PostgreSQL syntax like ILIKE, NULLS LAST, NULLS FIRST
-3. For case-insensitive search: Use LIKE (MySQL is case-insensitive by default)
-4. For ordering with nulls: Use IS NULL conditions in ORDER BY
-5. DO NOT mix columns from different tables without proper JOINs
-6. Always qualify column names with table aliases when using JOINs
-7. Use only columns that exist in the specified table
+        try:
+            prompts = [
+                build_prompt(query, schema, business)
+                for query, schema, business
+                in zip(natural_queries, schema_contexts, business_contexts)
+            ]
 
-### MySQL Syntax Examples
--- Case-insensitive search (MySQL default):
-SELECT * FROM customers WHERE country LIKE '%USA%';
+            with _llm_lock:
+                completions = [self._complete(prompt) for prompt in prompts]
 
--- NOT: SELECT * FROM customers WHERE country ILIKE '%USA%';
+            return [self._extract_sql(text).strip() for text in completions]
 
--- Ordering with nulls:
-SELECT * FROM employees ORDER BY reportsTo IS NULL, reportsTo;
-
--- NOT: SELECT * FROM employees ORDER BY reportsTo NULLS LAST;
+        except Exception as e:
+            logger.error(f"Batch SQL generation failed: {str(e)}")
+            raise
 
--- Proper JOIN with qualified columns:
-SELECT e.firstName, e.lastName, o.city 
-FROM employees e 
-JOIN offices o ON e.officeCode = o.officeCode;
+    def _complete(self, prompt: str) -> str:
+        """Run a single completion; caller must hold _llm_lock"""
+        response = self.model(
+            prompt,
+            max_tokens=Config.LLM_MAX_TOKENS,
+            temperature=Config.LLM_TEMPERATURE,
+            top_p=0.95,
+            stop=["</s>", ";", "\n\n"],
+            echo=False
+        )
+        return response['choices'][0]['text']
 
--- NOT: SELECT e.firstName, e.lastName, o.city, e.customerName 
--- (customerName is not in employees table!)
+    def _build_prompt(self, question: str, schema: str, business_context: str) -> str:
+        """
+        Build SQLCoder-specific prompt optimized for MySQL
 
-### Important Column Rules
-- customers table has: customerNumber, customerName, contactLastName, contactFirstName, phone, addressLine1, addressLine2, city, state, postalCode, country, salesRepEmployeeNumber, creditLimit
-- employees table has: employeeNumber, lastName, firstName, extension, email, officeCode, reportsTo, jobTitle
-- products table has: productCode, productName, productLine, productScale, productVendor, productDescription, quantityInStock, buyPrice, MSRP
-- orders table has: orderNumber, orderDate, requiredDate, shippedDate, status, comments, customerNumber
-- DO NOT use columns from one table in another table's query without JOIN
+        SQLCoder expects a specific format with schema and question. The
+        static rules block comes first so llama.cpp can reuse its KV cache
+        across calls and only prefill the per-request tail.
+        """
+        if business_context:
+            parts = (_PROMPT_HEAD, question, _PROMPT_SCHEMA, schema,
+                     _PROMPT_BUSINESS, business_context, _PROMPT_SQL)
+        else:
+            parts = (_PROMPT_HEAD, question, _PROMPT_SCHEMA, schema, _PROMPT_SQL)
 
-### Instructions
-- Generate ONLY MySQL-compatible SELECT queries
-- Use proper table and column names from the schema above
-- Include appropriate JOINs when accessing multiple tables
-- Use WHERE clauses for filtering
-- Add GROUP BY for aggregations
-- Use ORDER BY for sorting (without NULLS LAST/FIRST)
-- Use LIMIT for row limiting
-- Ensure all columns used exist in the tables specified
-- When joining tables, use table aliases and qualify all column names
-- Use LIKE for pattern matching (not ILIKE)
+        return ''.join(parts)
 
-### SQL Query
-```sql
-"""
+    def _build_schema_first_prompt(self, question: str, schema: str,
+                                   business_context: str) -> str:
+        """Build the prompt with the schema block ahead of the question"""
+        if business_context:
+            parts = (_PROMPT_SCHEMA_HEAD, schema, _PROMPT_TASK, question, "`",
+                     _PROMPT_BUSINESS, business_context, _PROMPT_SQL)
+        else:
+            parts = (_PROMPT_SCHEMA_HEAD, schema, _PROMPT_TASK, question, "`",
+                     _PROMPT_SQL)
 
-        return prompt
+        return ''.join(parts)
 
     def _extract_sql(self, text: str) -> str:
         """Extract SQL query from model output and clean up syntax"""
-        # Remove markdown code blocks if present
+        # Remove markdown code blocks if present (an unclosed fence runs to
+        # the end of the text)
         text = text.strip()
+        match = _SQL_FENCE_RE.search(text) or _FENCE_RE.search(text)
+        if match:
+            text = match.group(1)
 
-        if "```sql" in text:
-            parts = text.split("```sql")
-            if len(parts) > 1:
-                text = parts[1].split("```")[0]
-        elif "```" in text:
-            parts = text.split("```")
-            if len(parts) > 1:
-                text = parts[1].split("```")[0]
-
-        # Remove comments
-        lines = text.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            # Remove SQL comments
-            if '--' in line:
-                line = line[:line.index('--')]
-            if line.strip():
-                cleaned_lines.append(line)
-
-        sql = '\n'.join(cleaned_lines).strip()
+        # Remove SQL comments and blank lines
+        text = _SQL_COMMENT_RE.sub('', text)
+        sql = '\n'.join(line for line in text.splitlines() if line.strip()).strip()
 
         # Fix PostgreSQL syntax to MySQL syntax
         sql = self._fix_mysql_syntax(sql)
@@ -187,18 +343,9 @@ JOIN offices o ON e.officeCode = o.officeCode;
 
     def _fix_mysql_syntax(self, sql: str) -> str:
         """Fix common PostgreSQL syntax to MySQL equivalents"""
-        import re
-
-        # Replace ILIKE with LIKE (MySQL LIKE is case-insensitive by default)
-        sql = re.sub(r'\bILIKE\b', 'LIKE', sql, flags=re.IGNORECASE)
-
-        # Remove NULLS LAST / NULLS FIRST from ORDER BY
-        sql = re.sub(r'\s+NULLS\s+(LAST|FIRST)\b', '', sql, flags=re.IGNORECASE)
-
-        # Replace :: type casting with CAST function
-        # e.g., column::integer -> CAST(column AS SIGNED)
-        sql = re.sub(r'(\w+)::INTEGER', r'CAST(\1 AS SIGNED)', sql, flags=re.IGNORECASE)
-        sql = re.sub(r'(\w+)::TEXT', r'CAST(\1 AS CHAR)', sql, flags=re.IGNORECASE)
+        # ILIKE -> LIKE, drop NULLS LAST/FIRST, and rewrite :: type casting
+        # (e.g., column::integer -> CAST(column AS SIGNED)) in a single pass
+        sql = _PG_SYNTAX_RE.sub(_rewrite_pg_syntax, sql)
 
         # Fix CONCAT operator (|| in PostgreSQL vs CONCAT() in MySQL)
         # This is complex, so we'll leave it for now as it's less common
@@ -212,11 +359,14 @@ JOIN offices o ON e.officeCode = o.officeCode;
 
 # Singleton instance
 _llm_service = None
+_llm_service_lock = threading.Lock()
 
 
 def get_llm_service() -> LLMService:
     """Get or create LLM service instance"""
     global _llm_service
     if _llm_service is None:
-        _llm_service = LLMService()
+        with _llm_service_lock:
+            if _llm_service is None:
+                _llm_service = LLMService()
     return _llm_service
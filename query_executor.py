@@ -1,49 +1,131 @@
+import csv
+import io
+import orjson
 import pymysql
+from pymysql.constants import CLIENT
 import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator
+import re
 import time
-import signal
-from contextlib import contextmanager
+import threading
+from collections import OrderedDict
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, Engine
+from sqlalchemy.exc import DBAPIError
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-class TimeoutException(Exception):
-    pass
+# Optimizer hint so MySQL itself aborts long-running SELECTs
+_SELECT_RE = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
 
+# Existing LIMIT clause, checked against max_rows
+_LIMIT_SEARCH_RE = re.compile(r'\bLIMIT\s+(\d+)', re.IGNORECASE)
+_LIMIT_SUB_RE = re.compile(r'\bLIMIT\s+\d+', re.IGNORECASE)
 
-@contextmanager
-def timeout(seconds):
-    """Context manager for query timeout"""
+# Quoted string literals and identifiers, kept verbatim in result cache keys
+_QUOTED_RE = re.compile(
+    r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`(?:[^`]|``)*`)",
+    re.DOTALL
+)
+_WHITESPACE_RE = re.compile(r'\s+')
 
-    def timeout_handler(signum, frame):
-        raise TimeoutException("Query execution timeout")
+# ER_QUERY_TIMEOUT: statement aborted by MAX_EXECUTION_TIME
+_ER_QUERY_TIMEOUT = 3024
 
-    # Set the signal handler
-    original_handler = signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(seconds)
 
+# One pooled engine per (host, port, user, database), plus a separate
+# multi-statement variant used only for the app's own fixed SQL
+_engines: Dict[tuple, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def _pool_key(connection_params: Dict) -> tuple:
+    return (
+        connection_params['host'],
+        int(connection_params.get('port', 3306)),
+        connection_params['user'],
+        connection_params['database']
+    )
+
+
+def get_engine(connection_params: Dict, multi_statements: bool = False) -> Engine:
+    """
+    Get or create the pooled engine for a set of connection parameters
+
+    multi_statements=True returns a separate, small pool whose connections
+    accept several ';'-separated statements per round trip. It must never
+    run user or LLM generated SQL.
+    """
+    key = _pool_key(connection_params) + (multi_statements,)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            host, port, user, database, _ = key
+            url = URL.create(
+                'mysql+pymysql',
+                username=user,
+                password=connection_params['password'],
+                host=host,
+                port=port,
+                database=database
+            )
+            # Transport-level bound in case the server-side limit can't apply
+            connect_args = {
+                'connect_timeout': 5,
+                'read_timeout': Config.QUERY_TIMEOUT + 2,
+                'write_timeout': 5
+            }
+            if multi_statements:
+                connect_args['client_flag'] = CLIENT.MULTI_STATEMENTS
+            engine = create_engine(
+                url,
+                pool_size=1 if multi_statements else Config.DB_POOL_SIZE,
+                max_overflow=2 if multi_statements else Config.DB_POOL_MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=Config.DB_POOL_RECYCLE,
+                connect_args=connect_args
+            )
+            _engines[key] = engine
+            logger.info(f"Created connection pool for {host}:{port}/{database}")
+        return engine
+
+
+# Chart results up to this many rows skip the DataFrame path
+_SMALL_CHART_ROWS = 512
+
+
+def _to_float(value, fallback):
     try:
-        yield
-    finally:
-        signal.alarm(0)
-        signal.signal(signal.SIGALRM, original_handler)
+        return float(value)
+    except (ValueError, TypeError):
+        return fallback
 
 
 class QueryExecutor:
     def __init__(self):
         self.max_rows = Config.MAX_QUERY_ROWS
         self.query_timeout = Config.QUERY_TIMEOUT
+        # (pool key, normalized SQL) -> (expiry, result), least recent first
+        self._result_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()
 
-    def execute_query(self, connection_params: Dict, sql_query: str) -> Dict:
+    def execute_query(self, connection_params: Dict, sql_query: str,
+                      preview_rows: int = None) -> Dict:
         """
         Execute SQL query with timeout and result limiting
 
         Args:
             connection_params: Database connection parameters
             sql_query: SQL query to execute
+            preview_rows: Keep only this many rows, returned as 'preview'
+                instead of 'data' (the rest are counted, not kept)
 
         Returns:
             {
@@ -53,24 +135,34 @@ class QueryExecutor:
                 'row_count': int,
                 'execution_time_ms': int,
                 'truncated': bool,
+                'cached': bool,
+                'preview': list of dicts (preview mode, else None),
                 'error': str (if failed)
             }
+
+            In preview mode 'data' is omitted, on success and failure alike.
         """
         start_time = time.time()
 
+        # Repeated read-only queries are answered from the result cache
+        cache_key = None
+        if _SELECT_RE.match(sql_query):
+            cache_key = (_pool_key(connection_params), self._normalize_sql(sql_query))
+            cached = self._get_cached_result(cache_key)
+            if cached is not None:
+                if preview_rows is not None:
+                    cached['preview'] = cached.pop('data')[:preview_rows]
+                return cached
+            if preview_rows is not None:
+                # Preview results don't hold the full data, so aren't cached
+                cache_key = None
+
         try:
-            # Ensure query has LIMIT clause
-            limited_query = self._add_limit_clause(sql_query)
-
-            # Connect to database
-            connection = pymysql.connect(
-                host=connection_params['host'],
-                port=connection_params.get('port', 3306),
-                user=connection_params['user'],
-                password=connection_params['password'],
-                database=connection_params['database'],
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            # Ensure query has LIMIT clause and a server-side time limit
+            prepared_query = self._prepare_query(sql_query)
+
+            # Borrow a pooled connection (returned to the pool on close)
+            connection = get_engine(connection_params).raw_connection()
 
             result = {
                 'success': False,
@@ -79,24 +171,46 @@ class QueryExecutor:
                 'row_count': 0,
                 'execution_time_ms': 0,
                 'truncated': False,
+                'cached': False,
+                'preview': None,
                 'error': None
             }
+            if preview_rows is not None:
+                del result['data']
 
             try:
-                with timeout(self.query_timeout):
-                    with connection.cursor() as cursor:
-                        cursor.execute(limited_query)
-                        rows = cursor.fetchall()
-
-                        if rows:
-                            result['data'] = rows
-                            result['columns'] = list(rows[0].keys())
-                            result['row_count'] = len(rows)
-                            result['truncated'] = len(rows) >= self.max_rows
-
-                        result['success'] = True
-
-            except TimeoutException:
+                # Unbuffered cursor: rows are read off the socket on demand, so
+                # at most max_rows + 1 dicts are ever built (closing the cursor
+                # drains anything left)
+                with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+                    cursor.execute(prepared_query)
+
+                    if preview_rows is not None:
+                        preview = cursor.fetchmany(preview_rows)
+                        row_count = len(preview)
+                        for _ in cursor.fetchall_unbuffered():
+                            row_count += 1
+                        result['preview'] = preview
+                        result['truncated'] = row_count > self.max_rows
+                        result['row_count'] = min(row_count, self.max_rows)
+                        if preview:
+                            result['columns'] = list(preview[0].keys())
+                        rows = None
+                    else:
+                        rows = cursor.fetchmany(self.max_rows + 1)
+
+                    if rows:
+                        result['truncated'] = len(rows) > self.max_rows
+                        rows = rows[:self.max_rows]
+                        result['data'] = rows
+                        result['columns'] = list(rows[0].keys())
+                        result['row_count'] = len(rows)
+
+                    result['success'] = True
+
+            except pymysql.err.OperationalError as e:
+                if e.args[0] != _ER_QUERY_TIMEOUT:
+                    raise
                 result['error'] = f"Query exceeded timeout of {self.query_timeout} seconds"
                 logger.warning(f"Query timeout: {sql_query[:100]}")
 
@@ -106,55 +220,141 @@ class QueryExecutor:
             execution_time = int((time.time() - start_time) * 1000)
             result['execution_time_ms'] = execution_time
 
+            if result['success'] and cache_key is not None:
+                self._put_cached_result(cache_key, result)
+
             return result
 
-        except pymysql.Error as e:
+        except (pymysql.Error, DBAPIError) as e:
             logger.error(f"Database error: {str(e)}")
-            return {
-                'success': False,
-                'data': [],
-                'columns': [],
-                'row_count': 0,
-                'execution_time_ms': int((time.time() - start_time) * 1000),
-                'truncated': False,
-                'error': f"Database error: {str(e)}"
-            }
+            return self._error_result(f"Database error: {str(e)}", start_time, preview_rows)
         except Exception as e:
             logger.error(f"Query execution error: {str(e)}")
-            return {
-                'success': False,
-                'data': [],
-                'columns': [],
-                'row_count': 0,
-                'execution_time_ms': int((time.time() - start_time) * 1000),
-                'truncated': False,
-                'error': f"Execution error: {str(e)}"
-            }
+            return self._error_result(f"Execution error: {str(e)}", start_time, preview_rows)
+
+    @staticmethod
+    def _error_result(error: str, start_time: float, preview_rows: int = None) -> Dict:
+        """execute_query() result for a failed query (same keys as success)"""
+        result = {
+            'success': False,
+            'data': [],
+            'columns': [],
+            'row_count': 0,
+            'execution_time_ms': int((time.time() - start_time) * 1000),
+            'truncated': False,
+            'cached': False,
+            'preview': None,
+            'error': error
+        }
+        if preview_rows is not None:
+            del result['data']
+        return result
+
+    @staticmethod
+    def _normalize_sql(sql_query: str) -> str:
+        """
+        Result cache key for a statement
+
+        Only whitespace outside quoted literals/identifiers is collapsed;
+        case is kept, since string comparisons and (with
+        lower_case_table_names=0) table names can be case-sensitive.
+        """
+        parts = _QUOTED_RE.split(sql_query.strip().rstrip(';'))
+        # Odd indices are the quoted parts captured by the split
+        return ''.join(
+            part if i % 2 else _WHITESPACE_RE.sub(' ', part)
+            for i, part in enumerate(parts)
+        ).strip()
+
+    def _get_cached_result(self, cache_key: tuple):
+        """Return a copy of a live cached result, dropping it if expired"""
+        with self._result_cache_lock:
+            entry = self._result_cache.get(cache_key)
+            if entry is None:
+                return None
+            expiry, result = entry
+            if expiry < time.monotonic():
+                del self._result_cache[cache_key]
+                return None
+            self._result_cache.move_to_end(cache_key)
+
+        cached = dict(result)
+        cached['execution_time_ms'] = 0
+        cached['cached'] = True
+        return cached
+
+    def _put_cached_result(self, cache_key: tuple, result: Dict):
+        """Store a successful result, evicting the least recently used if full"""
+        with self._result_cache_lock:
+            self._result_cache[cache_key] = (
+                time.monotonic() + Config.RESULT_CACHE_TTL, dict(result)
+            )
+            self._result_cache.move_to_end(cache_key)
+            while len(self._result_cache) > Config.RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+
+    def invalidate(self, table: str = None):
+        """
+        Drop cached results, either all of them or only those whose SQL
+        mentions the given table (for use after writes to that table)
+        """
+        with self._result_cache_lock:
+            if table is None:
+                self._result_cache.clear()
+                return
+            pattern = re.compile(rf'\b{re.escape(table.lower())}\b')
+            stale = [key for key in self._result_cache if pattern.search(key[1])]
+            for key in stale:
+                del self._result_cache[key]
+
+    def dispose_pool(self, connection_params: Dict):
+        """
+        Close and drop the pool for these parameters, e.g. after reconnecting
+        or a schema refresh; the next query creates a fresh pool (picking up
+        changed credentials)
+        """
+        key = _pool_key(connection_params)
+        with _engines_lock:
+            engines = [_engines.pop(key + (multi,), None) for multi in (False, True)]
+        for engine in engines:
+            if engine is not None:
+                engine.dispose()
+
+        # Results from before a reconnect/refresh may be stale
+        with self._result_cache_lock:
+            stale = [k for k in self._result_cache if k[0] == key]
+            for k in stale:
+                del self._result_cache[k]
+
+    def _prepare_query(self, sql_query: str) -> str:
+        """Apply the row limit and a MAX_EXECUTION_TIME hint to a SELECT"""
+        sql_query = self._add_limit_clause(sql_query)
+        return _SELECT_RE.sub(
+            f'SELECT /*+ MAX_EXECUTION_TIME({self.query_timeout * 1000}) */',
+            sql_query,
+            count=1
+        )
 
     def _add_limit_clause(self, sql_query: str) -> str:
-        """Add LIMIT clause to query if not present"""
-        sql_upper = sql_query.upper().strip()
+        """
+        Add LIMIT clause to query if not present
+
+        The cap is one row over max_rows so execute_query can tell a result
+        that was cut off from one that fits exactly.
+        """
+        fetch_limit = self.max_rows + 1
 
         # Remove trailing semicolon
+        sql_query = sql_query.strip()
         if sql_query.endswith(';'):
             sql_query = sql_query[:-1].strip()
 
-        # Check if LIMIT already exists
-        if 'LIMIT' not in sql_upper:
-            sql_query += f' LIMIT {self.max_rows}'
-        else:
-            # Check if LIMIT exceeds max
-            import re
-            limit_match = re.search(r'LIMIT\s+(\d+)', sql_upper)
-            if limit_match:
-                limit_value = int(limit_match.group(1))
-                if limit_value > self.max_rows:
-                    sql_query = re.sub(
-                        r'LIMIT\s+\d+',
-                        f'LIMIT {self.max_rows}',
-                        sql_query,
-                        flags=re.IGNORECASE
-                    )
+        limit_match = _LIMIT_SEARCH_RE.search(sql_query)
+        if limit_match is None:
+            sql_query += f' LIMIT {fetch_limit}'
+        elif int(limit_match.group(1)) > fetch_limit:
+            # Existing LIMIT exceeds max
+            sql_query = _LIMIT_SUB_RE.sub(f'LIMIT {fetch_limit}', sql_query, count=1)
 
         return sql_query
 
@@ -166,12 +366,39 @@ class QueryExecutor:
             CSV string
         """
         try:
-            df = pd.DataFrame(data, columns=columns)
-            return df.to_csv(index=False)
+            return b''.join(self.export_csv_iter(data, columns)).decode('utf-8')
         except Exception as e:
             logger.error(f"CSV export failed: {str(e)}")
             raise
 
+    def export_csv_iter(self, data: List[Dict], columns: List[str],
+                        chunk_rows: int = 1000) -> Iterator[bytes]:
+        """
+        Export query results to CSV as UTF-8 chunks of chunk_rows rows
+
+        Suitable for passing straight to a streaming Response, so only one
+        chunk is ever held in memory.
+        """
+        # Rows are already dicts, so write them straight through
+        buffer = io.StringIO()
+        writer = csv.DictWriter(
+            buffer,
+            fieldnames=columns,
+            extrasaction='ignore',
+            lineterminator='\n'
+        )
+        writer.writeheader()
+
+        for start in range(0, len(data), chunk_rows):
+            writer.writerows(data[start:start + chunk_rows])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        if buffer.tell():
+            # Header only (no rows)
+            yield buffer.getvalue().encode('utf-8')
+
     def export_to_json(self, data: List[Dict]) -> str:
         """
         Export query results to JSON
@@ -180,12 +407,34 @@ class QueryExecutor:
             JSON string
         """
         try:
-            import json
-            return json.dumps(data, indent=2, default=str)
+            # Dates serialize natively (naive, no UTC offset); Decimal and
+            # anything else via str
+            return orjson.dumps(
+                data,
+                default=str,
+                option=orjson.OPT_INDENT_2
+            ).decode('utf-8')
         except Exception as e:
             logger.error(f"JSON export failed: {str(e)}")
             raise
 
+    def export_json_iter(self, data: List[Dict],
+                         chunk_rows: int = 1000) -> Iterator[bytes]:
+        """
+        Export query results as a compact JSON array in UTF-8 chunks
+
+        Each chunk holds up to chunk_rows serialized rows, for use with a
+        streaming Response.
+        """
+        yield b'['
+        for start in range(0, len(data), chunk_rows):
+            rows = b','.join(
+                orjson.dumps(row, default=str)
+                for row in data[start:start + chunk_rows]
+            )
+            yield b',' + rows if start else rows
+        yield b']'
+
     def prepare_chart_data(self, data: List[Dict],
                            chart_type: str) -> Dict:
         """
@@ -202,36 +451,42 @@ class QueryExecutor:
             if not data:
                 return {'data': [], 'type': chart_type}
 
+            # Below this size building a DataFrame costs more than it saves
+            if len(data) <= _SMALL_CHART_ROWS:
+                return self._prepare_small_chart_data(data, chart_type)
+
             # Convert to DataFrame for easier processing
             df = pd.DataFrame(data)
 
             if chart_type == 'pie':
                 # For pie charts, use first column as label, second as value
                 if len(df.columns) >= 2:
-                    chart_data = []
-                    for _, row in df.iterrows():
-                        chart_data.append({
-                            'name': str(row[df.columns[0]]),
-                            'value': float(row[df.columns[1]])
-                        })
+                    labels = df.iloc[:, 0].map(str)
+                    values = pd.to_numeric(df.iloc[:, 1], errors='coerce').astype(float)
+                    chart_data = [
+                        {'name': name, 'value': value}
+                        for name, value in zip(labels, values)
+                    ]
                     return {'data': chart_data, 'type': 'pie'}
 
             else:  # bar, line, area
                 # Use first column as X-axis
                 x_column = df.columns[0]
 
-                # All other numeric columns as Y-axis values
-                chart_data = []
-                for _, row in df.iterrows():
-                    data_point = {x_column: str(row[x_column])}
-
-                    for col in df.columns[1:]:
-                        try:
-                            data_point[col] = float(row[col])
-                        except (ValueError, TypeError):
-                            data_point[col] = str(row[col])
+                # Other columns as Y-axis values: numeric where they convert,
+                # otherwise the original value as a string
+                y_columns = {}
+                for col in df.columns[1:]:
+                    numeric = pd.to_numeric(df[col], errors='coerce')
+                    y_columns[col] = numeric.astype(object).where(
+                        numeric.notna(), df[col].map(str)
+                    )
 
-                    chart_data.append(data_point)
+                chart_df = pd.DataFrame(
+                    {x_column: df[x_column].map(str), **y_columns},
+                    columns=df.columns
+                )
+                chart_data = chart_df.to_dict(orient='records')
 
                 return {
                     'data': chart_data,
@@ -245,3 +500,35 @@ class QueryExecutor:
         except Exception as e:
             logger.error(f"Chart data preparation failed: {str(e)}")
             return {'data': [], 'type': chart_type, 'error': str(e)}
+
+    def _prepare_small_chart_data(self, data: List[Dict], chart_type: str) -> Dict:
+        """prepare_chart_data for small results, in plain Python"""
+        columns = list(data[0].keys())
+
+        if chart_type == 'pie':
+            if len(columns) < 2:
+                return {'data': [], 'type': chart_type}
+            label_column, value_column = columns[0], columns[1]
+            chart_data = [
+                {'name': str(row.get(label_column)),
+                 'value': _to_float(row.get(value_column), float('nan'))}
+                for row in data
+            ]
+            return {'data': chart_data, 'type': 'pie'}
+
+        x_column = columns[0]
+        y_columns = columns[1:]
+        chart_data = []
+        for row in data:
+            data_point = {x_column: str(row.get(x_column))}
+            for col in y_columns:
+                value = row.get(col)
+                data_point[col] = _to_float(value, str(value))
+            chart_data.append(data_point)
+
+        return {
+            'data': chart_data,
+            'type': chart_type,
+            'x_key': x_column,
+            'y_keys': y_columns
+        }
@@ -5,6 +5,7 @@ Test individual natural language queries quickly
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -167,10 +168,13 @@ def test_single_query(natural_query):
     # Generate SQL
     print("Generating SQL...")
     try:
+        # The schema is fixed, so lead with it and let llama.cpp reuse its
+        # evaluated tokens across queries
         sql = llm_service.generate_sql(
             natural_query,
             SCHEMA_DESCRIPTION,
-            business_context=""
+            business_context="",
+            schema_first=True
         )
 
         print("\n" + "-" * 80)
@@ -242,8 +246,16 @@ def interactive_mode():
         test_single_query(query)
 
 
-def batch_test():
-    """Run predefined test queries"""
+def batch_test(concurrent=False):
+    """
+    Run predefined test queries
+
+    With concurrent=True the queries run on a small thread pool without
+    pausing between them. Generation itself still takes the model lock one
+    query at a time (so n_threads needs no per-worker scaling); loading,
+    validation and output overlap, and output from different queries may
+    interleave.
+    """
 
     queries = [
         "Show me all customers from USA",
@@ -258,17 +270,27 @@ def batch_test():
     print("=" * 80)
 
     results = []
-    for i, query in enumerate(queries, 1):
-        print(f"\n[{i}/{len(queries)}] Testing: {query}")
-        sql = test_single_query(query)
-        results.append({
-            'query': query,
-            'sql': sql,
-            'success': sql is not None
-        })
-
-        if i < len(queries):
-            input("\nPress Enter for next query...")
+    if concurrent:
+        with ThreadPoolExecutor(max_workers=min(len(queries), 4)) as executor:
+            sqls = list(executor.map(test_single_query, queries))
+        for query, sql in zip(queries, sqls):
+            results.append({
+                'query': query,
+                'sql': sql,
+                'success': sql is not None
+            })
+    else:
+        for i, query in enumerate(queries, 1):
+            print(f"\n[{i}/{len(queries)}] Testing: {query}")
+            sql = test_single_query(query)
+            results.append({
+                'query': query,
+                'sql': sql,
+                'success': sql is not None
+            })
+
+            if i < len(queries):
+                input("\nPress Enter for next query...")
 
     # Summary
     print("\n" + "=" * 80)
@@ -287,7 +309,10 @@ def batch_test():
 if __name__ == "__main__":
     import sys
 
-    if len(sys.argv) > 1:
+    if sys.argv[1:] == ["--parallel"]:
+        # Non-interactive concurrent batch test
+        batch_test(concurrent=True)
+    elif len(sys.argv) > 1:
         # Command line query
         query = " ".join(sys.argv[1:])
         test_single_query(query)
@@ -1,14 +1,52 @@
 import faiss
 import numpy as np
-import pickle
+import orjson
 import os
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Tuple
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Recent query embeddings kept by RAGService
+_EMBEDDING_CACHE_SIZE = 128
+
+# HNSW graph parameters (neighbors per node, build/search beam widths)
+_HNSW_M = 32
+_HNSW_EF_CONSTRUCTION = 80
+_HNSW_EF_SEARCH = 64
+
+# Above this many documents the index is IVF-PQ instead (inverted lists
+# probed per search)
+_PQ_MIN_DOCUMENTS = 10000
+_IVF_NPROBE = 8
+
+
+def _read_file(path: str) -> bytearray:
+    """
+    Read a whole file into one preallocated buffer
+
+    On Linux the kernel is asked to start readahead for the full file
+    before the first read, so a cold load is a few large sequential reads.
+    """
+    with open(path, 'rb', buffering=0) as f:
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        offset = 0
+        while offset < size:
+            n = f.readinto(view[offset:])
+            if not n:
+                break
+            offset += n
+        return buffer
+
 
 class RAGService:
     def __init__(self):
@@ -17,58 +55,109 @@ class RAGService:
         self.documents = []
         self.metadata = []
         self.index_path = Config.FAISS_INDEX_PATH
+        # Normalized query text -> embedding, least recent first
+        self._emb_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._emb_cache_lock = threading.Lock()
         self._initialize_embedding_model()
 
     def _initialize_embedding_model(self):
         """Initialize sentence transformer for embeddings"""
         try:
             logger.info(f"Loading embedding model: {Config.EMBEDDING_MODEL}")
-            self.embedding_model = SentenceTransformer(Config.EMBEDDING_MODEL)
+            # Imported here so importing this module doesn't load torch
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            if torch.cuda.is_available():
+                # Half precision halves the bytes moved through the encoder
+                self.embedding_model = SentenceTransformer(
+                    Config.EMBEDDING_MODEL, device='cuda'
+                ).half()
+            else:
+                self.embedding_model = SentenceTransformer(
+                    Config.EMBEDDING_MODEL, device='cpu'
+                )
+                if Config.EMBEDDING_QUANTIZE == 'int8':
+                    # Dynamic int8 Linear layers: ~4x smaller weights and
+                    # faster CPU matmuls, at a small cost in embedding precision
+                    self.embedding_model = torch.quantization.quantize_dynamic(
+                        self.embedding_model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
             logger.info("Embedding model loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {str(e)}")
             raise
 
-    def build_index(self, schema_data: List[Dict], connection_id: int):
+    def build_index(self, schema_data: Iterable[Dict], connection_id: int):
         """
         Build FAISS index from schema and metadata
 
         Args:
-            schema_data: List of schema information dictionaries
+            schema_data: Schema information dictionaries; any iterable (it
+                is read once, so a generator avoids holding all entries)
             connection_id: Database connection ID
         """
         try:
             documents = []
+            # One list of schema entries per document, so identical texts
+            # are embedded once but still map back to every source entry
             metadata = []
+            seen = {}
+            entry_count = 0
 
             # Process schema data into documents
             for item in schema_data:
+                entry_count += 1
                 # Create document for each table/column with metadata
                 doc_text = self._create_document_text(item)
-                documents.append(doc_text)
-                metadata.append({
+                meta = {
                     'connection_id': connection_id,
                     'table_name': item.get('table_name'),
                     'column_name': item.get('column_name'),
                     'type': 'column' if item.get('column_name') else 'table'
-                })
+                }
+                meta.update(self._context_fields(item, doc_text))
+                idx = seen.get(doc_text)
+                if idx is None:
+                    seen[doc_text] = len(documents)
+                    documents.append(doc_text)
+                    metadata.append([meta])
+                else:
+                    metadata[idx].append(meta)
 
             if not documents:
                 logger.warning("No documents to index")
                 return
 
             # Generate embeddings
-            logger.info(f"Generating embeddings for {len(documents)} documents")
+            logger.info(f"Generating embeddings for {len(documents)} documents "
+                        f"({entry_count - len(documents)} duplicates skipped)")
             embeddings = self.embedding_model.encode(
                 documents,
-                show_progress_bar=True,
-                convert_to_numpy=True
+                batch_size=Config.EMBEDDING_BATCH_SIZE,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
             )
 
-            # Create FAISS index
+            # Create FAISS index: HNSW graph over unit vectors, so inner
+            # product is cosine similarity. Vectors are stored as 8-bit
+            # scalar codes (one byte per dimension); the quantizer is
+            # trained on the embeddings and saved with the index.
+            embeddings = embeddings.astype('float32', copy=False)
             dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(embeddings.astype('float32'))
+            if len(documents) > _PQ_MIN_DOCUMENTS and dimension % 4 == 0:
+                self.index = self._create_ivfpq_index(embeddings)
+            else:
+                self.index = faiss.IndexHNSWSQ(
+                    dimension,
+                    faiss.ScalarQuantizer.QT_8bit,
+                    _HNSW_M,
+                    faiss.METRIC_INNER_PRODUCT
+                )
+                self.index.hnsw.efConstruction = _HNSW_EF_CONSTRUCTION
+                self.index.train(embeddings)
+            self.index.add(embeddings)
 
             self.documents = documents
             self.metadata = metadata
@@ -82,6 +171,26 @@ class RAGService:
             logger.error(f"Failed to build FAISS index: {str(e)}")
             raise
 
+    @staticmethod
+    def _create_ivfpq_index(embeddings: np.ndarray):
+        """
+        Create and train an IVF-PQ fast-scan index for large corpora
+
+        Each vector is stored as dimension/4 4-bit product quantizer codes
+        (half a byte per 4 dimensions), and distances are computed with
+        SIMD lookup tables over blocks of codes.
+        """
+        dimension = embeddings.shape[1]
+        nlist = int(4 * np.sqrt(len(embeddings)))
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQFastScan(
+            quantizer, dimension, nlist, dimension // 4, 4,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(embeddings)
+        index.nprobe = _IVF_NPROBE
+        return index
+
     def _create_document_text(self, item: Dict) -> str:
         """Create searchable document text from schema item"""
         parts = []
@@ -126,6 +235,24 @@ class RAGService:
 
         return '. '.join(parts)
 
+    @staticmethod
+    def _context_fields(item: Dict, doc_text: str) -> Dict:
+        """
+        Pre-extract the pieces the context formatters print, so searches
+        don't re-parse document text
+        """
+        fields = {
+            # First sentence only, as shown in the LLM context
+            'description': (item.get('description') or '').split('.')[0].strip(),
+            'business_logic': (item.get('business_logic') or '').split('.')[0].strip()
+        }
+        if item.get('column_name'):
+            # Column document without its leading "TABLE: x. " part
+            fields['column_line'] = doc_text.replace(
+                f"TABLE: {item.get('table_name', '')}. ", '', 1
+            )
+        return fields
+
     def search(self, query: str, top_k: int = None) -> List[Tuple[str, Dict, float]]:
         """
         Search for relevant schema information
@@ -135,7 +262,8 @@ class RAGService:
             top_k: Number of results to return
 
         Returns:
-            List of (document_text, metadata, distance) tuples
+            List of (document_text, metadata, similarity) tuples, most
+            similar first
         """
         if top_k is None:
             top_k = Config.RAG_TOP_K
@@ -145,27 +273,30 @@ class RAGService:
                 logger.warning("Index not initialized")
                 return []
 
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode(
-                [query],
-                convert_to_numpy=True
-            )
+            # Query embedding (reused across calls for the same question)
+            query_embedding = self.embed_query(query)
 
             # Search index
-            distances, indices = self.index.search(
-                query_embedding.astype('float32'),
+            if hasattr(self.index, 'hnsw'):
+                self.index.hnsw.efSearch = _HNSW_EF_SEARCH
+            elif hasattr(self.index, 'nprobe'):
+                self.index.nprobe = _IVF_NPROBE
+            scores, indices = self.index.search(
+                query_embedding.reshape(1, -1),
                 min(top_k, len(self.documents))
             )
 
-            # Prepare results
+            # Prepare results, one per schema entry behind each hit (HNSW
+            # pads with -1 if it finds fewer than k)
             results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx < len(self.documents):
-                    results.append((
-                        self.documents[idx],
-                        self.metadata[idx],
-                        float(dist)
-                    ))
+            for score, idx in zip(scores[0], indices[0]):
+                if 0 <= idx < len(self.documents):
+                    for meta in self.metadata[idx]:
+                        results.append((
+                            self.documents[idx],
+                            meta,
+                            float(score)
+                        ))
 
             return results
 
@@ -173,6 +304,48 @@ class RAGService:
             logger.error(f"Search failed: {str(e)}")
             return []
 
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a natural language query as a unit-length float32 vector
+
+        The last few embeddings are cached, so the SQL cache lookup and the
+        context searches for one question run a single encoder pass.
+        """
+        key = query.strip().lower()
+        with self._emb_cache_lock:
+            embedding = self._emb_cache.get(key)
+            if embedding is not None:
+                self._emb_cache.move_to_end(key)
+                return embedding
+
+        embedding = self.embedding_model.encode(
+            [query],
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )[0].astype('float32')
+
+        with self._emb_cache_lock:
+            self._emb_cache[key] = embedding
+            while len(self._emb_cache) > _EMBEDDING_CACHE_SIZE:
+                self._emb_cache.popitem(last=False)
+        return embedding
+
+    def get_schema_and_business_context(self, query: str) -> Tuple[str, str]:
+        """
+        Get schema and business context for LLM from a single search
+
+        Args:
+            query: Natural language query
+
+        Returns:
+            (schema_context, business_context)
+        """
+        results = self.search(query)
+        return (
+            self._format_schema_context(results),
+            self._format_business_context(results)
+        )
+
     def get_schema_context(self, query: str) -> str:
         """
         Get formatted schema context for LLM
@@ -183,8 +356,10 @@ class RAGService:
         Returns:
             Formatted schema string with clear table separation
         """
-        results = self.search(query)
+        return self._format_schema_context(self.search(query))
 
+    def _format_schema_context(self, results: List[Tuple[str, Dict, float]]) -> str:
+        """Format search results as the schema context string"""
         if not results:
             return "No schema information available."
 
@@ -192,31 +367,32 @@ class RAGService:
         tables = {}
         table_relevance = {}
 
-        for doc, meta, dist in results:
+        for doc, meta, score in results:
             table_name = meta.get('table_name')
             if table_name not in tables:
                 tables[table_name] = {
                     'columns': [],
                     'description': '',
-                    'table_doc': ''
+                    'business_logic': ''
                 }
                 table_relevance[table_name] = []
 
-            # Track relevance (lower distance = more relevant)
-            table_relevance[table_name].append(dist)
+            # Track relevance (higher similarity = more relevant)
+            table_relevance[table_name].append(score)
 
             if meta.get('type') == 'column':
                 # Add column with full context
-                column_info = doc.replace(f'TABLE: {table_name}. ', '')
-                tables[table_name]['columns'].append(column_info)
+                tables[table_name]['columns'].append(meta['column_line'])
             else:
                 # Table-level info
-                tables[table_name]['table_doc'] = doc
+                tables[table_name]['description'] = meta['description']
+                tables[table_name]['business_logic'] = meta['business_logic']
 
-        # Sort tables by relevance (average distance)
+        # Sort tables by relevance (average similarity, best first)
         sorted_tables = sorted(
             tables.keys(),
-            key=lambda t: sum(table_relevance[t]) / len(table_relevance[t])
+            key=lambda t: sum(table_relevance[t]) / len(table_relevance[t]),
+            reverse=True
         )
 
         # Format schema with clear separation
@@ -226,15 +402,10 @@ class RAGService:
             info = tables[table_name]
             schema_parts.append(f"\n--- TABLE: {table_name} ---")
 
-            if info['table_doc']:
-                # Extract description from table doc
-                if 'Description:' in info['table_doc']:
-                    desc_part = info['table_doc'].split('Description:')[1].split('.')[0]
-                    schema_parts.append(f"Description: {desc_part}")
-                if 'Business Logic:' in info['table_doc']:
-                    logic_parts = info['table_doc'].split('Business Logic:')[1].split('.')
-                    if logic_parts[0].strip():
-                        schema_parts.append(f"Business Logic: {logic_parts[0].strip()}")
+            if info['description']:
+                schema_parts.append(f"Description: {info['description']}")
+            if info['business_logic']:
+                schema_parts.append(f"Business Logic: {info['business_logic']}")
 
             if info['columns']:
                 schema_parts.append(f"Columns in {table_name}:")
@@ -255,17 +426,15 @@ class RAGService:
         Returns:
             Business logic string
         """
-        results = self.search(query)
+        return self._format_business_context(self.search(query))
 
+    def _format_business_context(self, results: List[Tuple[str, Dict, float]]) -> str:
+        """Collect the distinct business logic lines from search results"""
         business_logic = []
-        for doc, meta, dist in results:
-            # Extract business logic from document
-            if 'Business Logic:' in doc:
-                parts = doc.split('Business Logic:')
-                if len(parts) > 1:
-                    logic = parts[1].split('.')[0].strip()
-                    if logic and logic not in business_logic:
-                        business_logic.append(logic)
+        for doc, meta, score in results:
+            logic = meta['business_logic']
+            if logic and logic not in business_logic:
+                business_logic.append(logic)
 
         return '\n- '.join([''] + business_logic) if business_logic else ''
 
@@ -278,23 +447,21 @@ class RAGService:
             )
             metadata_file = os.path.join(
                 self.index_path,
-                f'metadata_{connection_id}.pkl'
+                f'metadata_v2_{connection_id}.json'
             )
             docs_file = os.path.join(
                 self.index_path,
-                f'documents_{connection_id}.pkl'
+                f'documents_v2_{connection_id}.json'
             )
 
             if not all(os.path.exists(f) for f in [index_file, metadata_file, docs_file]):
                 return False
 
-            self.index = faiss.read_index(index_file)
-
-            with open(metadata_file, 'rb') as f:
-                self.metadata = pickle.load(f)
-
-            with open(docs_file, 'rb') as f:
-                self.documents = pickle.load(f)
+            # Older pickled metadata/documents files are not read; those
+            # indexes are rebuilt
+            self.index = self._read_index(index_file)
+            self.metadata = orjson.loads(_read_file(metadata_file))
+            self.documents = orjson.loads(_read_file(docs_file))
 
             logger.info(f"Loaded FAISS index for connection {connection_id}")
             return True
@@ -303,6 +470,23 @@ class RAGService:
             logger.error(f"Failed to load index: {str(e)}")
             return False
 
+    @staticmethod
+    def _read_index(index_file: str):
+        """
+        Memory-map a saved FAISS index, so vectors are paged in on demand
+        and shared through the page cache; index types that can't be
+        mapped are read into memory instead
+        """
+        try:
+            return faiss.read_index(
+                index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        except RuntimeError as e:
+            logger.info(f"Index can't be memory-mapped, reading it instead: {str(e)}")
+            return faiss.deserialize_index(
+                np.frombuffer(_read_file(index_file), dtype='uint8')
+            )
+
     def _save_index(self, connection_id: int):
         """Save FAISS index to disk"""
         try:
@@ -314,20 +498,20 @@ class RAGService:
             )
             metadata_file = os.path.join(
                 self.index_path,
-                f'metadata_{connection_id}.pkl'
+                f'metadata_v2_{connection_id}.json'
             )
             docs_file = os.path.join(
                 self.index_path,
-                f'documents_{connection_id}.pkl'
+                f'documents_v2_{connection_id}.json'
             )
 
             faiss.write_index(self.index, index_file)
 
             with open(metadata_file, 'wb') as f:
-                pickle.dump(self.metadata, f)
+                f.write(orjson.dumps(self.metadata))
 
             with open(docs_file, 'wb') as f:
-                pickle.dump(self.documents, f)
+                f.write(orjson.dumps(self.documents))
 
             logger.info(f"Saved FAISS index for connection {connection_id}")
 
@@ -338,11 +522,14 @@ class RAGService:
 
 # Singleton instance
 _rag_service = None
+_rag_service_lock = threading.Lock()
 
 
 def get_rag_service() -> RAGService:
     """Get or create RAG service instance"""
     global _rag_service
     if _rag_service is None:
-        _rag_service = RAGService()
+        with _rag_service_lock:
+            if _rag_service is None:
+                _rag_service = RAGService()
     return _rag_service
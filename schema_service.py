@@ -1,19 +1,145 @@
 import pymysql
-import json
+import orjson
 import os
+import time
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple
+from services.query_executor import get_engine
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Formatted schema strings kept by format_schema_for_llm
+_FORMAT_CACHE_SIZE = 16
+
+# Validation views kept by get_schema_for_validation
+_VALIDATION_MEMO_SIZE = 4
+
+# Fixed information_schema queries, each taking the schema name as %s
+
+# Cheap fingerprint of the table/column definitions: any added, dropped or
+# retyped column, changed default, or key/foreign key change changes it.
+# Each column's foreign key references (if any) are folded into its row.
+_FINGERPRINT_SQL = """
+    SELECT
+        COUNT(DISTINCT c.TABLE_NAME, c.COLUMN_NAME) AS column_count,
+        BIT_XOR(CRC32(CONCAT_WS('|', c.TABLE_NAME, c.COLUMN_NAME,
+            c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_KEY,
+            ISNULL(c.COLUMN_DEFAULT), c.COLUMN_DEFAULT, k.CONSTRAINT_NAME,
+            k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME))) AS checksum
+    FROM information_schema.COLUMNS c
+    LEFT JOIN information_schema.KEY_COLUMN_USAGE k
+        ON k.TABLE_SCHEMA = c.TABLE_SCHEMA
+        AND k.TABLE_NAME = c.TABLE_NAME
+        AND k.COLUMN_NAME = c.COLUMN_NAME
+        AND k.REFERENCED_TABLE_NAME IS NOT NULL
+    WHERE c.TABLE_SCHEMA = %s
+"""
+
+# The same fingerprint per table (COUNT and BIT_XOR combine across tables,
+# so the whole-schema fingerprint can be derived from these)
+_TABLE_FINGERPRINTS_SQL = """
+    SELECT
+        c.TABLE_NAME AS TABLE_NAME,
+        COUNT(DISTINCT c.COLUMN_NAME) AS column_count,
+        BIT_XOR(CRC32(CONCAT_WS('|', c.TABLE_NAME, c.COLUMN_NAME,
+            c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_KEY,
+            ISNULL(c.COLUMN_DEFAULT), c.COLUMN_DEFAULT, k.CONSTRAINT_NAME,
+            k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME))) AS checksum
+    FROM information_schema.COLUMNS c
+    LEFT JOIN information_schema.KEY_COLUMN_USAGE k
+        ON k.TABLE_SCHEMA = c.TABLE_SCHEMA
+        AND k.TABLE_NAME = c.TABLE_NAME
+        AND k.COLUMN_NAME = c.COLUMN_NAME
+        AND k.REFERENCED_TABLE_NAME IS NOT NULL
+    WHERE c.TABLE_SCHEMA = %s
+    GROUP BY c.TABLE_NAME
+"""
+
+_TABLES_SQL = """
+    SELECT TABLE_NAME, TABLE_COMMENT
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = %s
+    ORDER BY TABLE_NAME
+"""
+
+# {table_filter} is empty or an "AND TABLE_NAME IN (...)" clause
+_COLUMNS_SQL = """
+    SELECT
+        TABLE_NAME,
+        COLUMN_NAME,
+        COLUMN_TYPE,
+        IS_NULLABLE,
+        COLUMN_DEFAULT,
+        COLUMN_KEY
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = %s{table_filter}
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+_FOREIGN_KEYS_SQL = """
+    SELECT
+        TABLE_NAME,
+        COLUMN_NAME,
+        REFERENCED_TABLE_NAME,
+        REFERENCED_COLUMN_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = %s{table_filter}
+    AND REFERENCED_TABLE_NAME IS NOT NULL
+"""
+
+# InnoDB's persistent statistics (a primary key lookup by database)
+_INNODB_STATS_SQL = """
+    SELECT
+        table_name AS TABLE_NAME,
+        n_rows AS TABLE_ROWS,
+        clustered_index_size * @@innodb_page_size AS DATA_LENGTH
+    FROM mysql.innodb_table_stats
+    WHERE database_name = %s
+"""
+
+# Fallback when mysql.* isn't readable; makes the server gather statistics
+_TABLE_STATS_SQL = """
+    SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = %s
+"""
+
 
 class SchemaService:
-    def __init__(self):
+    def __init__(self, collect_stats: bool = None):
+        """
+        Args:
+            collect_stats: Fill in per-table row_count / size_bytes
+                (defaults to Config.SCHEMA_COLLECT_STATS); otherwise they
+                are 0 and extraction skips the storage-engine statistics
+        """
         self.cache_dir = Config.SCHEMA_CACHE_DIR
         self.cache_ttl = Config.SCHEMA_CACHE_TTL
+        self.collect_stats = (
+            Config.SCHEMA_COLLECT_STATS if collect_stats is None else collect_stats
+        )
         os.makedirs(self.cache_dir, exist_ok=True)
+        # cache_key -> (expiry timestamp, schema), in front of the disk cache
+        self._mem_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._mem_cache_lock = threading.Lock()
+        self._refreshing = set()
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='schema-refresh'
+        )
+        # (metadata list, its length, lookup map) for format_schema_for_llm
+        self._metadata_map_memo = None
+        # Formatted LLM schema strings, least recently used first
+        self._format_cache: "OrderedDict[tuple, str]" = OrderedDict()
+        self._format_cache_lock = threading.Lock()
+        # (database_name, extracted_at) -> (schema, validation view)
+        self._validation_memo: "OrderedDict[tuple, Tuple[Dict, Dict]]" = OrderedDict()
+        self._validation_memo_lock = threading.Lock()
 
     def extract_schema(self, connection_params: Dict) -> Dict:
         """
@@ -35,104 +161,23 @@ class SchemaService:
             # Check cache first
             cache_key = self._get_cache_key(connection_params)
             cached_schema = self._load_from_cache(cache_key)
+            if cached_schema and not self._is_current(connection_params, cached_schema):
+                logger.info("Database schema changed since it was cached")
+                previous_schema, cached_schema = cached_schema, None
+            else:
+                previous_schema = None
             if cached_schema:
                 logger.info("Loaded schema from cache")
+                # Near expiry: refresh now so no request pays for extraction
+                if self._expires_soon(cache_key):
+                    self._refresh_in_background(connection_params, cache_key)
                 return cached_schema
 
-            # Connect to database
-            connection = pymysql.connect(
-                host=connection_params['host'],
-                port=connection_params.get('port', 3306),
-                user=connection_params['user'],
-                password=connection_params['password'],
-                database=connection_params['database'],
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            # A stale or expired copy still lets unchanged tables be reused
+            if previous_schema is None:
+                previous_schema = self._load_from_cache(cache_key, allow_expired=True)
 
-            schema = {
-                'database_name': connection_params['database'],
-                'tables': {},
-                'extracted_at': datetime.utcnow().isoformat()
-            }
-
-            with connection.cursor() as cursor:
-                # Get all tables
-                cursor.execute("SHOW TABLES")
-                tables = cursor.fetchall()
-
-                table_key = f"Tables_in_{connection_params['database']}"
-
-                for table_row in tables:
-                    table_name = table_row[table_key]
-
-                    # Get table columns
-                    cursor.execute(f"DESCRIBE `{table_name}`")
-                    columns = cursor.fetchall()
-
-                    # Get table statistics
-                    cursor.execute(f"""
-                        SELECT TABLE_COMMENT, TABLE_ROWS, DATA_LENGTH
-                        FROM information_schema.TABLES
-                        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
-                    """, (connection_params['database'], table_name))
-                    table_info = cursor.fetchone()
-
-                    # Get foreign keys
-                    cursor.execute(f"""
-                        SELECT 
-                            COLUMN_NAME,
-                            REFERENCED_TABLE_NAME,
-                            REFERENCED_COLUMN_NAME
-                        FROM information_schema.KEY_COLUMN_USAGE
-                        WHERE TABLE_SCHEMA = %s 
-                        AND TABLE_NAME = %s
-                        AND REFERENCED_TABLE_NAME IS NOT NULL
-                    """, (connection_params['database'], table_name))
-                    foreign_keys = cursor.fetchall()
-
-                    # Build column information
-                    column_list = []
-                    primary_key = None
-                    fk_map = {fk['COLUMN_NAME']: {
-                        'ref_table': fk['REFERENCED_TABLE_NAME'],
-                        'ref_column': fk['REFERENCED_COLUMN_NAME']
-                    } for fk in foreign_keys}
-
-                    for col in columns:
-                        is_pk = col['Key'] == 'PRI'
-                        is_fk = col['Field'] in fk_map
-
-                        column_info = {
-                            'name': col['Field'],
-                            'type': col['Type'],
-                            'nullable': col['Null'] == 'YES',
-                            'default': col['Default'],
-                            'is_primary_key': is_pk,
-                            'is_foreign_key': is_fk,
-                            'foreign_key_ref': None
-                        }
-
-                        if is_pk:
-                            primary_key = col['Field']
-
-                        if is_fk:
-                            fk_info = fk_map[col['Field']]
-                            column_info['foreign_key_ref'] = (
-                                f"{fk_info['ref_table']}.{fk_info['ref_column']}"
-                            )
-
-                        column_list.append(column_info)
-
-                    # Add table to schema
-                    schema['tables'][table_name] = {
-                        'columns': column_list,
-                        'primary_key': primary_key,
-                        'row_count': table_info['TABLE_ROWS'] if table_info else 0,
-                        'size_bytes': table_info['DATA_LENGTH'] if table_info else 0,
-                        'comment': table_info['TABLE_COMMENT'] if table_info else ''
-                    }
-
-            connection.close()
+            schema = self._extract_from_database(connection_params, previous_schema)
 
             # Cache the schema
             self._save_to_cache(cache_key, schema)
@@ -144,6 +189,311 @@ class SchemaService:
             logger.error(f"Schema extraction failed: {str(e)}")
             raise
 
+    def extract_schema_diff(self, connection_params: Dict) -> Dict:
+        """
+        Extract the schema and report which tables changed since the
+        cached copy (an expired cache still counts as the baseline)
+
+        Returns:
+            {
+                'added': [table_name, ...],
+                'removed': [table_name, ...],
+                'modified': [table_name, ...]
+            }
+        """
+        previous = self._load_from_cache(
+            self._get_cache_key(connection_params), allow_expired=True
+        )
+        schema = self.extract_schema(connection_params)
+
+        old_tables = previous['tables'] if previous else {}
+        new_tables = schema['tables']
+        return {
+            'added': [name for name in new_tables if name not in old_tables],
+            'removed': [name for name in old_tables if name not in new_tables],
+            'modified': [
+                name for name, table_info in new_tables.items()
+                if name in old_tables
+                and self._table_signature(table_info)
+                != self._table_signature(old_tables[name])
+            ]
+        }
+
+    def _extract_from_database(self, connection_params: Dict,
+                               previous: Dict = None) -> Dict:
+        """
+        Read the schema from information_schema, bypassing the cache
+
+        With a previous extraction, only tables whose fingerprint (columns,
+        defaults, keys and foreign keys) changed, or that are new, have
+        their columns and foreign keys re-read; the rest are carried over.
+        """
+        # Borrow a connection from the multi-statement pool for this database
+        # (only ever used for the fixed queries at the top of this module)
+        connection = get_engine(connection_params, multi_statements=True).raw_connection()
+
+        schema = {
+            'database_name': connection_params['database'],
+            'tables': {},
+            'extracted_at': datetime.utcnow().isoformat()
+        }
+
+        database = connection_params['database']
+        previous_fingerprints = (previous or {}).get('table_fingerprints')
+        incremental = previous_fingerprints is not None
+
+        # Fingerprints first, so a change made mid-extraction makes the
+        # cached copy look stale rather than current
+        statements = [_TABLE_FINGERPRINTS_SQL, _TABLES_SQL]
+        if not incremental:
+            statements += [_COLUMNS_SQL.format(table_filter=''),
+                           _FOREIGN_KEYS_SQL.format(table_filter='')]
+        if self.collect_stats:
+            statements.append(_INNODB_STATS_SQL)
+
+        try:
+            # Unbuffered cursor: rows are grouped as they arrive instead of
+            # first being collected into a result list. All statements go in
+            # one round trip; each result set is read in full before nextset().
+            with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+                cursor.execute(';'.join(statements), (database,) * len(statements))
+
+                table_fingerprints = {
+                    row['TABLE_NAME']: self._format_fingerprint(
+                        row['column_count'], row['checksum']
+                    )
+                    for row in cursor
+                }
+
+                # All tables
+                cursor.nextset()
+                tables = list(cursor)
+
+                if incremental:
+                    changed = [
+                        t['TABLE_NAME'] for t in tables
+                        if t['TABLE_NAME'] not in previous['tables']
+                        or previous_fingerprints.get(t['TABLE_NAME'])
+                        != table_fingerprints.get(t['TABLE_NAME'])
+                    ]
+                else:
+                    # Columns and foreign keys of every table
+                    cursor.nextset()
+                    columns_by_table, fks_by_table = self._group_columns_and_fks(cursor)
+
+                # Row counts and sizes are opt-in (see __init__)
+                stats = {}
+                if self.collect_stats:
+                    try:
+                        cursor.nextset()
+                        stats = self._read_table_stats(cursor)
+                    except pymysql.err.MySQLError as e:
+                        logger.info(f"innodb_table_stats unavailable, using information_schema: {str(e)}")
+                        cursor.execute(_TABLE_STATS_SQL, (database,))
+                        stats = self._read_table_stats(cursor)
+
+                if incremental:
+                    columns_by_table, fks_by_table = defaultdict(list), defaultdict(list)
+                    if changed:
+                        # Second round trip, limited to the changed tables
+                        table_filter = ' AND TABLE_NAME IN ({})'.format(
+                            ', '.join(['%s'] * len(changed))
+                        )
+                        cursor.execute(
+                            _COLUMNS_SQL.format(table_filter=table_filter) + ';'
+                            + _FOREIGN_KEYS_SQL.format(table_filter=table_filter),
+                            (database, *changed, database, *changed)
+                        )
+                        columns_by_table, fks_by_table = self._group_columns_and_fks(cursor)
+                    logger.info(f"Incremental schema extraction: {len(changed)} "
+                                f"of {len(tables)} tables changed")
+        finally:
+            # Return the connection to the pool
+            connection.close()
+
+        # Whole-schema fingerprint, as _FINGERPRINT_SQL would compute it
+        column_count, checksum = 0, 0
+        for fingerprint in table_fingerprints.values():
+            count, crc = fingerprint.split(':')
+            column_count += int(count)
+            checksum ^= int(crc)
+        schema['fingerprint'] = self._format_fingerprint(column_count, checksum)
+        schema['table_fingerprints'] = table_fingerprints
+
+        for table_info in tables:
+            table_name = table_info['TABLE_NAME']
+            row_count, size_bytes = stats.get(table_name, (0, 0))
+
+            if incremental and table_name not in columns_by_table:
+                # Unchanged: reuse the previous entry with fresh comment/stats
+                table_entry = dict(previous['tables'][table_name])
+                table_entry.update({
+                    'row_count': row_count,
+                    'size_bytes': size_bytes,
+                    'comment': table_info['TABLE_COMMENT'] or ''
+                })
+                schema['tables'][table_name] = table_entry
+                continue
+
+            column_parts = self._build_columns(
+                columns_by_table[table_name], fks_by_table[table_name]
+            )
+            schema['tables'][table_name] = self._build_table_entry(
+                table_info, *column_parts, row_count, size_bytes
+            )
+
+        return schema
+
+    @staticmethod
+    def _group_columns_and_fks(cursor) -> Tuple[Dict, Dict]:
+        """
+        Read a columns result set, then (via nextset) a foreign keys result
+        set, grouping both by table
+        """
+        columns_by_table = defaultdict(list)
+        for col in cursor:
+            columns_by_table[col['TABLE_NAME']].append(col)
+
+        cursor.nextset()
+        fks_by_table = defaultdict(list)
+        for fk in cursor:
+            fks_by_table[fk['TABLE_NAME']].append(fk)
+
+        return columns_by_table, fks_by_table
+
+    @staticmethod
+    def _build_columns(columns: List[Dict], foreign_keys: List[Dict]) -> Tuple:
+        """
+        Build one table's column information from information_schema rows
+
+        Returns:
+            (column list, primary key, {fk column: 'ref_table.ref_column'})
+        """
+        column_list = []
+        fk_refs = {}
+        primary_key = None
+        fk_map = {fk['COLUMN_NAME']: {
+            'ref_table': fk['REFERENCED_TABLE_NAME'],
+            'ref_column': fk['REFERENCED_COLUMN_NAME']
+        } for fk in foreign_keys}
+
+        for col in columns:
+            is_pk = col['COLUMN_KEY'] == 'PRI'
+            is_fk = col['COLUMN_NAME'] in fk_map
+
+            column_info = {
+                'name': col['COLUMN_NAME'],
+                'type': col['COLUMN_TYPE'],
+                'nullable': col['IS_NULLABLE'] == 'YES',
+                'default': col['COLUMN_DEFAULT'],
+                'is_primary_key': is_pk,
+                'is_foreign_key': is_fk,
+                'foreign_key_ref': None
+            }
+
+            if is_pk:
+                primary_key = col['COLUMN_NAME']
+
+            if is_fk:
+                fk_info = fk_map[col['COLUMN_NAME']]
+                column_info['foreign_key_ref'] = (
+                    f"{fk_info['ref_table']}.{fk_info['ref_column']}"
+                )
+                fk_refs[col['COLUMN_NAME']] = column_info['foreign_key_ref']
+
+            column_list.append(column_info)
+
+        return column_list, primary_key, fk_refs
+
+    @staticmethod
+    def _table_signature(table_info: Dict) -> str:
+        """
+        Hash of a table's (name, type, is_pk, is_fk) column tuples
+
+        Stored with each extracted table; computed for older cache entries.
+        """
+        signature = table_info.get('signature')
+        if signature is None:
+            signature = format(zlib.crc32(orjson.dumps(sorted(
+                (col['name'], col['type'], col['is_primary_key'], col['is_foreign_key'])
+                for col in table_info['columns']
+            ))), '08x')
+        return signature
+
+    @staticmethod
+    def _build_table_entry(table_info: Dict, column_list: List[Dict],
+                           primary_key: str, fk_refs: Dict, row_count: int,
+                           size_bytes: int) -> Dict:
+        """Build one schema['tables'] entry (plus the validator's view of it)"""
+        table_entry = {
+            'columns': column_list,
+            'primary_key': primary_key,
+            'row_count': row_count,
+            'size_bytes': size_bytes,
+            'comment': table_info['TABLE_COMMENT'] or '',
+            '_validation': {
+                'columns': [col['name'] for col in column_list],
+                'foreign_keys': fk_refs
+            }
+        }
+        table_entry['signature'] = SchemaService._table_signature(table_entry)
+        return table_entry
+
+    @staticmethod
+    def _read_table_stats(cursor) -> Dict[str, Tuple[int, int]]:
+        """Collect (row_count, size_bytes) per table from a stats result"""
+        return {
+            row['TABLE_NAME']: (int(row['TABLE_ROWS'] or 0), int(row['DATA_LENGTH'] or 0))
+            for row in cursor
+        }
+
+    @staticmethod
+    def _format_fingerprint(column_count, checksum) -> str:
+        return f"{column_count}:{checksum}"
+
+    def _query_fingerprint(self, connection, database: str) -> str:
+        """Run _FINGERPRINT_SQL on its own"""
+        with connection.cursor() as cursor:
+            cursor.execute(_FINGERPRINT_SQL, (database,))
+            column_count, checksum = cursor.fetchone()
+        return self._format_fingerprint(column_count, checksum)
+
+    def _is_current(self, connection_params: Dict, schema: Dict) -> bool:
+        """Check a cached schema's fingerprint against the live database"""
+        try:
+            connection = get_engine(connection_params).raw_connection()
+            try:
+                fingerprint = self._query_fingerprint(
+                    connection, connection_params['database']
+                )
+            finally:
+                connection.close()
+        except Exception as e:
+            # Can't tell; fall back to trusting the TTL
+            logger.warning(f"Schema fingerprint check failed: {str(e)}")
+            return True
+
+        return schema.get('fingerprint') == fingerprint
+
+    def _refresh_in_background(self, connection_params: Dict, cache_key: str):
+        """Re-extract a schema whose cache entry is about to expire"""
+        with self._mem_cache_lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+
+        def refresh():
+            try:
+                self._save_to_cache(cache_key, self._extract_from_database(connection_params))
+                logger.info(f"Schema cache refreshed for {cache_key}")
+            except Exception as e:
+                logger.warning(f"Background schema refresh failed: {str(e)}")
+            finally:
+                with self._mem_cache_lock:
+                    self._refreshing.discard(cache_key)
+
+        self._refresh_executor.submit(refresh)
+
     def format_schema_for_llm(self, schema: Dict,
                               metadata: List[Dict] = None) -> str:
         """
@@ -156,14 +506,41 @@ class SchemaService:
         Returns:
             Formatted schema string
         """
+        # A schema only changes on re-extraction, so the output is reused
+        # per (extraction, metadata content)
+        format_key = None
+        if schema.get('extracted_at'):
+            format_key = (
+                schema.get('database_name'),
+                schema['extracted_at'],
+                tuple(
+                    (m['table_name'], m.get('column_name'),
+                     m.get('description'), m.get('business_logic'))
+                    for m in metadata or ()
+                )
+            )
+            with self._format_cache_lock:
+                formatted_schema = self._format_cache.get(format_key)
+                if formatted_schema is not None:
+                    self._format_cache.move_to_end(format_key)
+                    return formatted_schema
+
+        formatted_schema = self._format_schema_for_llm(schema, metadata)
+
+        if format_key is not None:
+            with self._format_cache_lock:
+                self._format_cache[format_key] = formatted_schema
+                while len(self._format_cache) > _FORMAT_CACHE_SIZE:
+                    self._format_cache.popitem(last=False)
+
+        return formatted_schema
+
+    def _format_schema_for_llm(self, schema: Dict, metadata: List[Dict]) -> str:
+        """Uncached format_schema_for_llm()"""
         formatted = []
 
-        # Create metadata lookup
-        metadata_map = {}
-        if metadata:
-            for item in metadata:
-                key = (item['table_name'], item.get('column_name'))
-                metadata_map[key] = item
+        # Metadata lookup (built once per metadata list)
+        metadata_map = self._get_metadata_map(metadata)
 
         for table_name, table_info in schema['tables'].items():
             formatted.append(f"\nTable: {table_name}")
@@ -184,23 +561,44 @@ class SchemaService:
                 col_name = col['name']
                 col_type = col['type']
 
-                col_str = f"    - {col_name} ({col_type})"
+                col_parts = [f"    - {col_name} ({col_type})"]
 
                 # Add column metadata
                 col_meta = metadata_map.get((table_name, col_name))
                 if col_meta and col_meta.get('description'):
-                    col_str += f" - {col_meta['description']}"
+                    col_parts.append(f" - {col_meta['description']}")
 
                 if col['is_primary_key']:
-                    col_str += " [PRIMARY KEY]"
+                    col_parts.append(" [PRIMARY KEY]")
 
                 if col['is_foreign_key']:
-                    col_str += f" [FK -> {col['foreign_key_ref']}]"
+                    col_parts.append(f" [FK -> {col['foreign_key_ref']}]")
 
-                formatted.append(col_str)
+                formatted.append(''.join(col_parts))
 
         return '\n'.join(formatted)
 
+    def _get_metadata_map(self, metadata: List[Dict]) -> Dict:
+        """
+        Index metadata by (table_name, column_name)
+
+        The last map is memoized against the metadata list it came from, so
+        repeated formatting with the same list doesn't rebuild it.
+        """
+        if not metadata:
+            return {}
+
+        memo = self._metadata_map_memo
+        if memo is not None and memo[0] is metadata and memo[1] == len(metadata):
+            return memo[2]
+
+        metadata_map = {
+            (item['table_name'], item.get('column_name')): item
+            for item in metadata
+        }
+        self._metadata_map_memo = (metadata, len(metadata), metadata_map)
+        return metadata_map
+
     def get_schema_for_validation(self, schema: Dict) -> Dict:
         """
         Get schema in format suitable for validator
@@ -213,10 +611,42 @@ class SchemaService:
                     'foreign_keys': {...}
                 }
             }
+
+        The result is memoized per extraction (the same dict is returned
+        for the same schema object), so don't modify it.
         """
+        key = (schema.get('database_name'), schema.get('extracted_at'))
+        with self._validation_memo_lock:
+            entry = self._validation_memo.get(key)
+            if entry is not None and entry[0] is schema:
+                self._validation_memo.move_to_end(key)
+                return entry[1]
+
+        validation_schema = self._get_schema_for_validation(schema)
+
+        with self._validation_memo_lock:
+            self._validation_memo[key] = (schema, validation_schema)
+            self._validation_memo.move_to_end(key)
+            while len(self._validation_memo) > _VALIDATION_MEMO_SIZE:
+                self._validation_memo.popitem(last=False)
+        return validation_schema
+
+    def _get_schema_for_validation(self, schema: Dict) -> Dict:
+        """Build the validator's view of schema (uncached)"""
         validation_schema = {}
 
         for table_name, table_info in schema['tables'].items():
+            # Precomputed during extraction
+            precomputed = table_info.get('_validation')
+            if precomputed is not None:
+                validation_schema[table_name] = {
+                    'columns': precomputed['columns'],
+                    'primary_key': table_info['primary_key'],
+                    'foreign_keys': precomputed['foreign_keys']
+                }
+                continue
+
+            # Schemas cached before '_validation' existed
             validation_schema[table_name] = {
                 'columns': [col['name'] for col in table_info['columns']],
                 'primary_key': table_info['primary_key'],
@@ -233,10 +663,24 @@ class SchemaService:
 
     def _get_cache_key(self, connection_params: Dict) -> str:
         """Generate cache key from connection parameters"""
-        return f"{connection_params['host']}_{connection_params['database']}"
+        # Users can see different tables, so they don't share an entry
+        return (
+            f"{connection_params['host']}_{connection_params['user']}"
+            f"_{connection_params['database']}"
+        )
+
+    def _load_from_cache(self, cache_key: str, allow_expired: bool = False) -> Dict:
+        """
+        Load schema from cache if valid (memory first, then disk)
+
+        allow_expired returns an entry even past its TTL, as a baseline for
+        incremental extraction.
+        """
+        with self._mem_cache_lock:
+            entry = self._mem_cache.get(cache_key)
+        if entry is not None and (allow_expired or time.time() < entry[0]):
+            return entry[1]
 
-    def _load_from_cache(self, cache_key: str) -> Dict:
-        """Load schema from cache if valid"""
         cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
 
         if not os.path.exists(cache_file):
@@ -245,30 +689,81 @@ class SchemaService:
         try:
             # Check if cache is still valid
             file_mtime = datetime.fromtimestamp(os.path.getmtime(cache_file))
-            if datetime.now() - file_mtime > timedelta(seconds=self.cache_ttl):
+            if (not allow_expired
+                    and datetime.now() - file_mtime > timedelta(seconds=self.cache_ttl)):
                 logger.info("Cache expired")
                 return None
 
-            with open(cache_file, 'r') as f:
-                return json.load(f)
+            with open(cache_file, 'rb') as f:
+                schema = orjson.loads(f.read())
+
+            self._remember(cache_key, schema, file_mtime.timestamp() + self.cache_ttl)
+            return schema
         except Exception as e:
             logger.error(f"Failed to load cache: {str(e)}")
             return None
 
+    def _remember(self, cache_key: str, schema: Dict, expiry: float):
+        with self._mem_cache_lock:
+            self._mem_cache[cache_key] = (expiry, schema)
+
+    def _expires_soon(self, cache_key: str) -> bool:
+        """True if the in-memory entry has under 10% of its TTL left"""
+        with self._mem_cache_lock:
+            entry = self._mem_cache.get(cache_key)
+        return entry is not None and entry[0] - time.time() < self.cache_ttl * 0.1
+
     def _save_to_cache(self, cache_key: str, schema: Dict):
         """Save schema to cache"""
+        self._remember(cache_key, schema, time.time() + self.cache_ttl)
+
         cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
 
+        # Write a private temp file and rename it over the cache file, so a
+        # reader or a crash never leaves a partially written cache behind
+        tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+
         try:
-            with open(cache_file, 'w') as f:
-                json.dump(schema, f, indent=2)
+            # 1 MiB buffer: the per-table pieces go to disk in large blocks
+            with open(tmp_file, 'wb', buffering=1 << 20) as f:
+                self._stream_json(schema, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, cache_file)
             logger.info(f"Schema cached to {cache_file}")
         except Exception as e:
             logger.error(f"Failed to save cache: {str(e)}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    @staticmethod
+    def _stream_json(schema: Dict, f):
+        """
+        Write schema as JSON one table at a time, so the whole document is
+        never held in memory as a single serialized string
+        """
+        f.write(b'{')
+        for key, value in schema.items():
+            if key != 'tables':
+                f.write(orjson.dumps(key) + b':' + orjson.dumps(value) + b',')
+
+        f.write(b'"tables":{')
+        for i, (table_name, table_info) in enumerate(schema.get('tables', {}).items()):
+            if i:
+                f.write(b',')
+            f.write(orjson.dumps(table_name) + b':' + orjson.dumps(table_info))
+        f.write(b'}}')
 
     def invalidate_cache(self, connection_params: Dict):
         """Invalidate cache for a connection"""
         cache_key = self._get_cache_key(connection_params)
+        with self._mem_cache_lock:
+            self._mem_cache.pop(cache_key, None)
+        with self._format_cache_lock:
+            self._format_cache.clear()
+        with self._validation_memo_lock:
+            self._validation_memo.clear()
+
         cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
 
         if os.path.exists(cache_file):
@@ -283,14 +778,9 @@ class SchemaService:
             (success, message)
         """
         try:
-            connection = pymysql.connect(
-                host=connection_params['host'],
-                port=connection_params.get('port', 3306),
-                user=connection_params['user'],
-                password=connection_params['password'],
-                database=connection_params['database'],
-                connect_timeout=5
-            )
+            # Goes through the shared pool, so the connection opened here is
+            # reused by extract_schema and query execution
+            connection = get_engine(connection_params).raw_connection()
             connection.close()
             return True, "Connection successful"
         except Exception as e:
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def compute_schema_hash(schema: Dict) -> str:
+    """Stable fingerprint of a schema's tables (ignores extraction time)"""
+    payload = json.dumps(schema['tables'], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class SQLCache:
+    """
+    Cache of generated SQL keyed by (schema_hash, natural query)
+
+    Exact hits match on the normalized query text. Semantic hits compare
+    the query embedding against cached ones and reuse the SQL of the
+    closest entry above the similarity threshold.
+    """
+
+    def __init__(self, max_size: int = None, similarity_threshold: float = None):
+        self.max_size = max_size or Config.SQL_CACHE_SIZE
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else Config.SQL_CACHE_SIMILARITY
+        )
+        # (schema_hash, query_key) -> (sql, embedding or None)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, Optional[np.ndarray]]]" = OrderedDict()
+        # Stacked embeddings for semantic lookup, rebuilt lazily after writes
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _query_key(natural_query: str) -> str:
+        return ' '.join(natural_query.lower().split())
+
+    def get(self, schema_hash: str, natural_query: str) -> Optional[str]:
+        """Return cached SQL for an exact (normalized) query match"""
+        key = (schema_hash, self._query_key(natural_query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def get_similar(self, schema_hash: str, embedding: np.ndarray) -> Optional[str]:
+        """
+        Return cached SQL for the most similar query under the same schema
+
+        Args:
+            schema_hash: Fingerprint of the schema the SQL was generated for
+            embedding: Unit-length query embedding
+
+        Returns:
+            Cached SQL, or None if no entry clears the similarity threshold
+        """
+        with self._lock:
+            if self._matrix is None:
+                self._rebuild_matrix()
+            if not self._matrix_keys:
+                return None
+
+            # Embeddings are unit-length, so the dot product is cosine similarity
+            scores = self._matrix @ embedding
+            for idx in np.argsort(scores)[::-1]:
+                if scores[idx] < self.similarity_threshold:
+                    break
+                key = self._matrix_keys[idx]
+                if key[0] == schema_hash:
+                    self._entries.move_to_end(key)
+                    logger.info(f"Semantic SQL cache hit (similarity {scores[idx]:.3f})")
+                    return self._entries[key][0]
+            return None
+
+    def put(self, schema_hash: str, natural_query: str, sql: str,
+            embedding: np.ndarray = None):
+        """Store generated SQL, evicting the least recently used entry if full"""
+        key = (schema_hash, self._query_key(natural_query))
+        with self._lock:
+            self._entries[key] = (sql, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        """Drop all cached SQL (e.g. after a schema refresh)"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._matrix_keys = []
+
+    def _rebuild_matrix(self):
+        """Stack cached embeddings into one matrix; caller must hold the lock"""
+        keys = [key for key, (_, emb) in self._entries.items() if emb is not None]
+        self._matrix_keys = keys
+        if keys:
+            self._matrix = np.vstack([self._entries[key][1] for key in keys])
+        else:
+            self._matrix = np.empty((0, 0), dtype='float32')
+
+
+# Singleton instance
+_sql_cache = None
+_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache() -> SQLCache:
+    """Get or create SQL cache instance"""
+    global _sql_cache
+    if _sql_cache is None:
+        with _sql_cache_lock:
+            if _sql_cache is None:
+                _sql_cache = SQLCache()
+    return _sql_cache
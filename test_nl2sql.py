@@ -3,18 +3,20 @@ Main Test Script for NL2SQL System
 Tests natural language query generation and execution
 """
 
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Add backend to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from services.llm_service import get_llm_service
-from services.rag_service import get_rag_service
+# The LLM, RAG, schema and query services pull in faiss, torch, SQLAlchemy
+# and pandas; they are imported where first used, so a run without the model
+# stops before loading any of them
 from services.validator import SQLValidator
-from services.schema_service import SchemaService
-from services.query_executor import QueryExecutor
 from config import Config
 
 # Sample metadata with business context
@@ -522,12 +524,38 @@ SAMPLE_METADATA = [
 ]
 
 
+# (table_name, column_name) -> metadata entry; column_name is None for tables
+META_INDEX = {(m['table_name'], m.get('column_name')): m for m in SAMPLE_METADATA}
+
+# Digest of the metadata for schema_key(); after this only META_INDEX is kept
+_META_DIGEST = hashlib.sha256(
+    json.dumps(SAMPLE_METADATA, sort_keys=True, default=str).encode('utf-8')
+).hexdigest()
+del SAMPLE_METADATA
+
+
+# Formatted schema strings, keyed by schema_key()
+_FORMATTED_SCHEMAS = {}
+
+
 def print_separator():
     print("\n" + "=" * 80 + "\n")
 
 
+def schema_key(schema):
+    """Hash of the schema tables and the sample metadata (what the index is built from)"""
+    payload = json.dumps(
+        {'tables': schema['tables'], 'meta': _META_DIGEST},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
 def build_rag_index(connection_params):
     """Build RAG index with schema and metadata"""
+    from services.rag_service import get_rag_service
+    from services.schema_service import SchemaService
+
     print("Extracting schema from database...")
 
     schema_service = SchemaService()
@@ -535,14 +563,20 @@ def build_rag_index(connection_params):
 
     print(f"✓ Schema extracted: {len(schema['tables'])} tables found")
 
+    # Reuse the index saved by an earlier run for the same schema + metadata
+    index_id = f"test_{schema_key(schema)[:16]}"
+    rag_service = get_rag_service()
+    if rag_service.load_index(index_id):
+        print("✓ RAG index loaded from cache")
+        return schema
+
     # Prepare schema data for RAG
     schema_data = []
 
     # Add table and column information
     for table_name, table_info in schema['tables'].items():
         # Table-level entry
-        table_meta = next((m for m in SAMPLE_METADATA if m['table_name'] == table_name and m['column_name'] is None),
-                          None)
+        table_meta = META_INDEX.get((table_name, None))
         schema_data.append({
             'table_name': table_name,
             'column_name': None,
@@ -553,9 +587,7 @@ def build_rag_index(connection_params):
 
         # Column-level entries
         for col in table_info['columns']:
-            col_meta = next(
-                (m for m in SAMPLE_METADATA if m['table_name'] == table_name and m.get('column_name') == col['name']),
-                None)
+            col_meta = META_INDEX.get((table_name, col['name']))
             schema_data.append({
                 'table_name': table_name,
                 'column_name': col['name'],
@@ -570,23 +602,28 @@ def build_rag_index(connection_params):
 
     # Build index
     print("Building RAG index...")
-    rag_service = get_rag_service()
-    rag_service.build_index(schema_data, connection_id=1)
+    rag_service.build_index(schema_data, connection_id=index_id)
     print("✓ RAG index built successfully")
 
     return schema
 
 
 def format_schema_for_llm(schema):
-    """Format schema for LLM consumption"""
+    """Format schema for LLM consumption (cached per schema_key)"""
+    key = schema_key(schema)
+    if key not in _FORMATTED_SCHEMAS:
+        _FORMATTED_SCHEMAS[key] = _format_schema_for_llm(schema)
+    return _FORMATTED_SCHEMAS[key]
+
+
+def _format_schema_for_llm(schema):
     formatted = []
 
     for table_name, table_info in schema['tables'].items():
         formatted.append(f"\nTable: {table_name}")
 
         # Add table description
-        table_meta = next(
-            (m for m in SAMPLE_METADATA if m['table_name'] == table_name and m.get('column_name') is None), None)
+        table_meta = META_INDEX.get((table_name, None))
         if table_meta and table_meta.get('description'):
             formatted.append(f"  Description: {table_meta['description']}")
         if table_meta and table_meta.get('business_logic'):
@@ -594,21 +631,19 @@ def format_schema_for_llm(schema):
 
         formatted.append("  Columns:")
         for col in table_info['columns']:
-            col_str = f"    - {col['name']} ({col['type']})"
+            parts = [f"    - {col['name']} ({col['type']})"]
 
             # Add column metadata
-            col_meta = next(
-                (m for m in SAMPLE_METADATA if m['table_name'] == table_name and m.get('column_name') == col['name']),
-                None)
+            col_meta = META_INDEX.get((table_name, col['name']))
             if col_meta and col_meta.get('description'):
-                col_str += f" - {col_meta['description']}"
+                parts.append(f" - {col_meta['description']}")
 
             if col['is_primary_key']:
-                col_str += " [PRIMARY KEY]"
+                parts.append(" [PRIMARY KEY]")
             if col['is_foreign_key']:
-                col_str += f" [FK -> {col.get('foreign_key_ref')}]"
+                parts.append(f" [FK -> {col.get('foreign_key_ref')}]")
 
-            formatted.append(col_str)
+            formatted.append(''.join(parts))
 
     return '\n'.join(formatted)
 
@@ -631,55 +666,70 @@ def get_validation_schema(schema):
     return validation_schema
 
 
-def test_query(query_text, schema, use_rag=True, execute=False, connection_params=None):
+def test_query(query_text, schema, llm_service, rag_service, validator=None, use_rag=True,
+               execute=False, connection_params=None, formatted_schema=None, rag_context=None,
+               generated_sql=None):
     """
     Test a natural language query
 
     Args:
         query_text: Natural language question
         schema: Database schema dictionary
+        llm_service: LLM service used to generate SQL
+        rag_service: RAG service used for context retrieval
+        validator: SQLValidator for schema (built here if not given)
         use_rag: Whether to use RAG for context retrieval
         execute: Whether to execute the query on database
         connection_params: Database connection parameters for execution
+        formatted_schema: format_schema_for_llm(schema), if already computed
+        rag_context: (schema_context, business_context) already retrieved
+            for query_text
+        generated_sql: SQL already generated for query_text (e.g. by a
+            batch call); skips generation
     """
     print(f"Natural Language Query: {query_text}")
     print("-" * 80)
 
     # Get schema context
     if use_rag:
-        rag_service = get_rag_service()
-        schema_context = rag_service.get_schema_context(query_text)
-        business_context = rag_service.get_business_context(query_text)
+        if rag_context is None:
+            rag_context = rag_service.get_schema_and_business_context(query_text)
+        schema_context, business_context = rag_context
         print("RAG Retrieved Context:")
         print(schema_context[:500] + "..." if len(schema_context) > 500 else schema_context)
     else:
-        schema_context = format_schema_for_llm(schema)
+        if formatted_schema is None:
+            formatted_schema = format_schema_for_llm(schema)
+        schema_context = formatted_schema
         business_context = ""
 
     print("\n" + "-" * 80)
 
     # Generate SQL
-    print("Generating SQL...")
-    llm_service = get_llm_service()
+    if generated_sql is None:
+        print("Generating SQL...")
 
-    try:
-        generated_sql = llm_service.generate_sql(
-            query_text,
-            schema_context,
-            business_context
-        )
+        try:
+            # Without RAG the schema is the same for every query, so put it
+            # first and let llama.cpp reuse it from the KV cache
+            generated_sql = llm_service.generate_sql(
+                query_text,
+                schema_context,
+                business_context,
+                schema_first=not use_rag
+            )
+        except Exception as e:
+            print(f"❌ SQL Generation Failed: {str(e)}")
+            return None
 
-        print(f"\nGenerated SQL:\n{generated_sql}")
-    except Exception as e:
-        print(f"❌ SQL Generation Failed: {str(e)}")
-        return None
+    print(f"\nGenerated SQL:\n{generated_sql}")
 
     print("\n" + "-" * 80)
 
     # Validate SQL
     print("Validating SQL...")
-    validation_schema = get_validation_schema(schema)
-    validator = SQLValidator(validation_schema)
+    if validator is None:
+        validator = SQLValidator(get_validation_schema(schema))
 
     is_valid, errors = validator.validate(generated_sql)
     cost_estimate = validator.estimate_cost(generated_sql)
@@ -699,19 +749,20 @@ def test_query(query_text, schema, use_rag=True, execute=False, connection_param
     if execute and connection_params:
         print("\n" + "-" * 80)
         print("Executing Query...")
+        from services.query_executor import QueryExecutor
         executor = QueryExecutor()
 
         try:
-            result = executor.execute_query(connection_params, generated_sql)
+            result = executor.execute_query(connection_params, generated_sql, preview_rows=5)
 
             if result['success']:
                 print(f"✓ Execution Successful")
                 print(f"Rows Returned: {result['row_count']}")
                 print(f"Execution Time: {result['execution_time_ms']}ms")
 
-                if result['data']:
+                if result['preview']:
                     print("\nFirst 5 Results:")
-                    for i, row in enumerate(result['data'][:5]):
+                    for i, row in enumerate(result['preview']):
                         print(f"{i + 1}. {row}")
 
                     if result['truncated']:
@@ -726,6 +777,12 @@ def test_query(query_text, schema, use_rag=True, execute=False, connection_param
 
 def main():
     """Main test function"""
+    # Non-interactive mode (for benchmarking / CI): no prompts, and
+    # NL2SQL_EXECUTE=1 decides whether queries are executed. --parallel
+    # runs the test queries concurrently and implies --auto.
+    parallel = '--parallel' in sys.argv
+    auto = os.environ.get('NL2SQL_AUTO') == '1' or '--auto' in sys.argv or parallel
+
     print_separator()
     print("NL2SQL SYSTEM TEST")
     print(f"Timestamp: {datetime.now()}")
@@ -739,14 +796,18 @@ def main():
         print("wget https://huggingface.co/defog/sqlcoder-7b-2/resolve/main/sqlcoder-7b-q5_k_m.gguf")
         return
 
-    # Get database connection parameters
+    from services.llm_service import get_llm_service
+    from services.rag_service import get_rag_service
+    from services.schema_service import SchemaService
+
+    # Get database connection parameters (same variables as config.py)
     print("Database Connection Setup")
     print("-" * 80)
-    host = "localhost"
-    port = "3306"
-    user = "root"
-    password = "Jp^6"
-    database = "classicmodels"
+    host = os.getenv('MYSQL_HOST', 'localhost')
+    port = os.getenv('MYSQL_PORT', '3306')
+    user = os.getenv('MYSQL_USER', 'root')
+    password = os.getenv('MYSQL_PASSWORD', '')
+    database = os.getenv('MYSQL_DATABASE', 'classicmodels')
 
     connection_params = {
         'host': host,
@@ -756,16 +817,18 @@ def main():
         'database': database
     }
 
-    # Test connection
-    print("\nTesting database connection...")
-    schema_service = SchemaService()
-    success, message = schema_service.test_connection(connection_params)
+    # Test connection (NL2SQL_SKIP_CONN_TEST=1 skips it for offline runs;
+    # schema extraction then reports connection errors)
+    if os.environ.get('NL2SQL_SKIP_CONN_TEST') != '1':
+        print("\nTesting database connection...")
+        schema_service = SchemaService()
+        success, message = schema_service.test_connection(connection_params)
 
-    if not success:
-        print(f"❌ Connection failed: {message}")
-        return
+        if not success:
+            print(f"❌ Connection failed: {message}")
+            return
 
-    print("✓ Database connection successful")
+        print("✓ Database connection successful")
     print_separator()
 
     # Initialize services
@@ -787,6 +850,8 @@ def main():
         print(f"❌ Failed to build RAG index: {str(e)}")
         return
 
+    rag_service = get_rag_service()
+
     print_separator()
 
     # Test queries
@@ -805,13 +870,32 @@ def main():
     ]
 
     # Ask user if they want to execute queries
-    execute_queries = False
-    response = input("\nDo you want to execute queries on the database? (y/n): ").lower()
-    if response == 'y':
-        execute_queries = True
+    execute_queries = os.environ.get('NL2SQL_EXECUTE') == '1'
+    if not auto:
+        response = input("\nDo you want to execute queries on the database? (y/n): ").lower()
+        execute_queries = response == 'y'
+
+    # Same for every query; the formatted schema is only used when RAG is off
+    formatted_schema = format_schema_for_llm(schema)
+    validator = SQLValidator(get_validation_schema(schema))
+
+    # Generation only: run every query through the model in one batch, so
+    # the shared prompt prefix stays in the KV cache between them
+    batch_sql = [None] * len(test_queries)
+    contexts = [None] * len(test_queries)
+    if not execute_queries and len(test_queries) > 1:
+        print("Generating SQL for all test queries...")
+        contexts = [rag_service.get_schema_and_business_context(q) for q in test_queries]
+        try:
+            batch_sql = llm_service.generate_sql_batch(
+                test_queries,
+                [schema_context for schema_context, _ in contexts],
+                [business_context for _, business_context in contexts]
+            )
+        except Exception as e:
+            print(f"❌ Batch generation failed, generating per query: {str(e)}")
 
-    # Run test queries
-    for i, query in enumerate(test_queries, 1):
+    def run_test(i, query, context, sql):
         print(f"\n{'=' * 80}")
         print(f"TEST QUERY {i}/{len(test_queries)}")
         print(f"{'=' * 80}\n")
@@ -820,15 +904,32 @@ def main():
             test_query(
                 query,
                 schema,
+                llm_service,
+                rag_service,
+                validator,
                 use_rag=True,
                 execute=execute_queries,
-                connection_params=connection_params if execute_queries else None
+                connection_params=connection_params if execute_queries else None,
+                formatted_schema=formatted_schema,
+                rag_context=context,
+                generated_sql=sql
             )
         except Exception as e:
             print(f"❌ Test failed: {str(e)}")
 
-        if i < len(test_queries):
-            input("\nPress Enter to continue to next query...")
+    # Run test queries
+    jobs = list(zip(range(1, len(test_queries) + 1), test_queries, contexts, batch_sql))
+    if parallel:
+        # The LLM lock still serializes generation; retrieval, validation
+        # and execution overlap. Output from different queries may interleave.
+        with ThreadPoolExecutor(max_workers=min(len(jobs), 4)) as executor:
+            list(executor.map(lambda job: run_test(*job), jobs))
+    else:
+        for job in jobs:
+            run_test(*job)
+
+            if job[0] < len(test_queries) and not auto:
+                input("\nPress Enter to continue to next query...")
 
     print_separator()
     print("✓ All tests completed!")
@@ -4,6 +4,7 @@ Helper functions for building RAG index from schema
 
 from services.rag_service import get_rag_service
 import logging
+import sys
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +40,11 @@ DEFAULT_METADATA = [
     }
 ]
 
+# Table-level entries of DEFAULT_METADATA by table name
+_DEFAULT_META_BY_TABLE = {
+    m['table_name']: m for m in DEFAULT_METADATA if m.get('column_name') is None
+}
+
 
 def build_rag_index_from_schema(schema, connection_id):
     """
@@ -50,40 +56,41 @@ def build_rag_index_from_schema(schema, connection_id):
     """
     rag_service = get_rag_service()
 
-    # Prepare schema data for RAG
-    schema_data = []
+    # Build and save index (entries are generated as the index consumes them)
+    rag_service.build_index(_iter_schema_data(schema), connection_id)
+    logger.info(f"✓ RAG index built with {len(rag_service.documents)} documents")
+
 
+def _iter_schema_data(schema):
+    """Yield the RAG entries for schema: one per table, then one per column"""
     for table_name, table_info in schema['tables'].items():
+        # Interned: the table name is repeated in every column entry (and
+        # in the index metadata built from them), as are common column types
+        table_name = sys.intern(table_name)
+
         # Find metadata for this table
-        table_meta = next(
-            (m for m in DEFAULT_METADATA
-             if m['table_name'] == table_name and m.get('column_name') is None),
-            None
-        )
+        table_meta = _DEFAULT_META_BY_TABLE.get(table_name)
 
         # Table-level entry
-        schema_data.append({
+        yield {
             'table_name': table_name,
             'column_name': None,
             'description': table_meta['description'] if table_meta else table_info.get('comment', ''),
             'business_logic': table_meta['business_logic'] if table_meta else '',
             'examples': []
-        })
+        }
 
-        # Column-level entries
+        # Column-level entries. Columns carry no description, business logic
+        # or examples here; those keys are left out (rag_service reads every
+        # field with .get()), and so is the FK reference when there is none.
         for col in table_info['columns']:
-            schema_data.append({
+            col_entry = {
                 'table_name': table_name,
                 'column_name': col['name'],
-                'data_type': col['type'],
-                'description': '',
-                'business_logic': '',
-                'examples': [],
+                'data_type': sys.intern(col['type']),
                 'is_primary_key': col.get('is_primary_key', False),
-                'is_foreign_key': col.get('is_foreign_key', False),
-                'foreign_key_ref': col.get('foreign_key_ref')
-            })
-
-    # Build and save index
-    rag_service.build_index(schema_data, connection_id)
-    logger.info(f"✓ RAG index built with {len(schema_data)} documents")
\ No newline at end of file
+                'is_foreign_key': col.get('is_foreign_key', False)
+            }
+            if col.get('foreign_key_ref'):
+                col_entry['foreign_key_ref'] = col['foreign_key_ref']
+            yield col_entry
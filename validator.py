@@ -1,13 +1,73 @@
 import sqlparse
 from sqlparse.sql import IdentifierList, Identifier, Where, Function
-from sqlparse.tokens import Keyword, DML
+from sqlparse.lexer import tokenize
+from sqlparse.tokens import Keyword, DML, Punctuation, Comment, Whitespace
+import multiprocessing
+import os
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, defaultdict
 from typing import Dict, List, Tuple
 from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Validation / cost results remembered per validator (keyed by SQL text)
+_RESULT_CACHE_SIZE = 256
+
+# Tokens for the parenthesis-depth scan: quoted strings/identifiers (skipped),
+# an opening parenthesis (with SELECT when it starts a subquery), or a closing one
+_PAREN_SCAN_RE = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`"
+    r"|(?P<open>\(\s*(?P<select>SELECT\b)?)|(?P<close>\))"
+)
+
+# validate_batch() only uses worker processes for at least this many
+# uncached queries (more than /api/query/batch sends with the default
+# Config.MAX_BATCH_QUERIES of 8, so the app validates those in-process)
+_BATCH_PARALLEL_MIN = 64
+
+# Queries sent to a worker process per task
+_BATCH_CHUNK_SIZE = 16
+
+# Deletes identifier quoting characters in one str.translate() call
+_QUOTE_TRANS = str.maketrans('', '', '`"[]')
+
+# Bare words that are never treated as column references
+_SQL_KEYWORDS = frozenset({
+    'SELECT', 'FROM', 'WHERE', 'AS', '*', 'GROUP', 'ORDER', 'BY', 'HAVING',
+    'LIMIT', 'DISTINCT', 'ON', 'AND', 'OR', 'NOT', 'IN', 'IS', 'NULL'
+})
+
+# Parsed statements remembered per validator, so validate() and
+# estimate_cost() on the same SQL parse it once (trees are large; keep few)
+_PARSE_CACHE_SIZE = 32
+
+# Every JOIN, typed (INNER/LEFT/RIGHT/FULL/CROSS JOIN) or plain, matched once
+_JOIN_RE = re.compile(r'\b(?:(?:INNER|LEFT|RIGHT|FULL|CROSS)\s+)?JOIN\b')
+
+# Injection patterns: comment markers are plain substring checks; the
+# word-bounded keywords share one alternation (one named group per message),
+# only run when one of the _DANGER_WORDS substrings is present
+_DANGER_LITERALS = [
+    ('--', "SQL comments not allowed"),
+    ('/*', "Multi-line comments not allowed"),
+]
+_DANGER_WORDS = ('EXEC', 'OUTFILE', 'LOAD_FILE')
+_DANGER_RE = re.compile(
+    r'(?P<execute>\bEXECUTE\b)|(?P<exec>\bEXEC\b)'
+    r'|(?P<outfile>\bINTO\s+OUTFILE\b)|(?P<load_file>\bLOAD_FILE\b)'
+)
+_DANGER_MESSAGES = [
+    ('exec', "EXEC command not allowed"),
+    ('execute', "EXECUTE command not allowed"),
+    ('outfile', "INTO OUTFILE not allowed"),
+    ('load_file', "LOAD_FILE not allowed"),
+]
+
 
 class SQLValidator:
     def __init__(self, schema_info: Dict):
@@ -25,42 +85,151 @@ class SQLValidator:
                 }
         """
         self.schema_info = schema_info
+        # Column sets per table, and the tables each column name appears in
+        self._table_cols = {
+            table: frozenset(info['columns']) for table, info in schema_info.items()
+        }
+        self._col_to_tables = defaultdict(set)
+        for table, columns in self._table_cols.items():
+            for column in columns:
+                self._col_to_tables[column].add(table)
         self.max_joins = Config.MAX_JOINS
         self.max_subquery_depth = Config.MAX_SUBQUERY_DEPTH
+        # Exact SQL text -> result, least recent first
+        self._validate_cache: "OrderedDict[str, Tuple[bool, List[str]]]" = OrderedDict()
+        self._cost_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._parse_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _cache_get(self, cache: OrderedDict, key: str):
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, cache: OrderedDict, key: str, value,
+                   max_size: int = _RESULT_CACHE_SIZE):
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > max_size:
+                cache.popitem(last=False)
+
+    def _parse(self, sql_query: str) -> tuple:
+        """sqlparse.parse(), cached per exact SQL text (treat as read-only)"""
+        parsed = self._cache_get(self._parse_cache, sql_query)
+        if parsed is None:
+            parsed = sqlparse.parse(sql_query)
+            self._cache_put(self._parse_cache, sql_query, parsed, _PARSE_CACHE_SIZE)
+        return parsed
 
     def validate(self, sql_query: str) -> Tuple[bool, List[str]]:
         """
         Validate SQL query against all constraints
 
+        Results are cached per exact SQL text (the checks depend on it, e.g.
+        a trailing newline after ';'), so re-validating the same query skips
+        parsing.
+
         Returns:
             (is_valid, list_of_errors)
         """
+        cached = self._cache_get(self._validate_cache, sql_query)
+        if cached is None:
+            cached = self._validate(sql_query)
+            self._cache_put(self._validate_cache, sql_query, cached)
+
+        is_valid, errors = cached
+        return is_valid, list(errors)
+
+    def validate_batch(self, queries: List[str]) -> List[Tuple[bool, List[str]]]:
+        """
+        validate() for many queries (e.g. several LLM candidates)
+
+        Large batches (at least _BATCH_PARALLEL_MIN uncached queries) are
+        validated in a shared pool of spawned worker processes, since
+        parsing is CPU-bound; results are cached here as usual. The app's
+        batch route is capped at Config.MAX_BATCH_QUERIES (8 by default),
+        so it only reaches the pool if that limit is raised.
+
+        Returns:
+            One (is_valid, list_of_errors) per query, in input order
+        """
+        results = [self._cache_get(self._validate_cache, sql_query) for sql_query in queries]
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        computed = None
+        if len(pending) >= _BATCH_PARALLEL_MIN:
+            chunks = [
+                [queries[i] for i in pending[start:start + _BATCH_CHUNK_SIZE]]
+                for start in range(0, len(pending), _BATCH_CHUNK_SIZE)
+            ]
+            try:
+                computed = [
+                    result
+                    for chunk_results in _get_batch_pool().map(
+                        _validate_chunk_in_worker,
+                        [self.schema_info] * len(chunks),
+                        chunks
+                    )
+                    for result in chunk_results
+                ]
+            except BrokenProcessPool as e:
+                logger.warning(f"Validation worker pool failed, validating in-process: {str(e)}")
+                _discard_batch_pool()
+        if computed is None:
+            computed = [self._validate(queries[i]) for i in pending]
+
+        for i, result in zip(pending, computed):
+            self._cache_put(self._validate_cache, queries[i], result)
+            results[i] = result
+
+        return [(is_valid, list(errors)) for is_valid, errors in results]
+
+    def _validate(self, sql_query: str) -> Tuple[bool, List[str]]:
+        """Uncached validate()"""
         errors = []
 
         try:
+            # Reject non-SELECT statements from the token stream alone,
+            # before the (much slower) grouping pass of a full parse
+            if self._first_keyword_is_select(sql_query) is False:
+                return False, ["Only SELECT queries are allowed"]
+
             # Parse SQL
-            parsed = sqlparse.parse(sql_query)
+            parsed = self._parse(sql_query)
             if not parsed:
                 return False, ["Invalid SQL syntax"]
 
             statement = parsed[0]
 
-            # 1. Check if SELECT only
+            # Upper-cased once for every keyword check below. sqlparse keeps
+            # the text verbatim, so for a single statement it is also the
+            # statement's text and the tree needn't be serialized again.
+            sql_upper = sql_query.upper()
+            statement_upper = sql_upper if len(parsed) == 1 else None
+
+            # 1. Check if SELECT only (anything else is rejected outright)
             if not self._is_select_only(statement):
-                errors.append("Only SELECT queries are allowed")
+                return False, ["Only SELECT queries are allowed"]
+
+            # 2. Check for dangerous patterns: string checks only, so run
+            # them before walking the tree and stop if any match
+            danger_errors = self._check_dangerous_patterns(sql_query, sql_upper)
+            if danger_errors:
+                return False, danger_errors
 
-            # 2. Check query complexity
-            complexity_errors = self._check_complexity(statement)
+            # 3. Check query complexity
+            complexity_errors = self._check_complexity(
+                self._analyze(statement, statement_upper)
+            )
             errors.extend(complexity_errors)
 
-            # 3. Validate tables and columns exist in schema
+            # 4. Validate tables and columns exist in schema
             schema_errors = self._validate_schema(statement)
             errors.extend(schema_errors)
 
-            # 4. Check for dangerous patterns
-            danger_errors = self._check_dangerous_patterns(sql_query)
-            errors.extend(danger_errors)
-
             is_valid = len(errors) == 0
             return is_valid, errors
 
@@ -68,6 +237,18 @@ class SQLValidator:
             logger.error(f"Validation error: {str(e)}")
             return False, [f"Validation failed: {str(e)}"]
 
+    @staticmethod
+    def _first_keyword_is_select(sql_query: str):
+        """
+        Whether the first token that isn't whitespace or a comment is
+        SELECT, using only the lexer; None if there is no such token
+        """
+        for ttype, value in tokenize(sql_query):
+            if ttype in Whitespace or ttype in Comment:
+                continue
+            return ttype is DML and value.upper() == 'SELECT'
+        return None
+
     def _is_select_only(self, statement) -> bool:
         """Check if query is SELECT only"""
         first_token = statement.token_first(skip_ws=True, skip_cm=True)
@@ -76,19 +257,38 @@ class SQLValidator:
 
         return first_token.ttype is DML and first_token.value.upper() == 'SELECT'
 
-    def _check_complexity(self, statement) -> List[str]:
-        """Check query complexity constraints"""
+    def _analyze(self, statement, sql_upper: str = None) -> Dict:
+        """
+        Collect the structural metrics of a parsed statement in one place
+
+        The upper-cased SQL (sql_upper, if the caller already has it) is
+        shared by the JOIN count and the keyword checks, and each walk runs
+        once per statement however many of the metrics the caller uses.
+        """
+        if sql_upper is None:
+            sql_upper = str(statement).upper()
+        return {
+            'sql_upper': sql_upper,
+            'join_count': self._count_joins(sql_upper),
+            'subquery_depth': self._subquery_depth(statement, sql_upper),
+            'has_aggregation': 'GROUP BY' in sql_upper,
+            'has_order': 'ORDER BY' in sql_upper,
+            'has_distinct': 'DISTINCT' in sql_upper
+        }
+
+    def _check_complexity(self, analysis: Dict) -> List[str]:
+        """Check query complexity constraints (analysis from _analyze())"""
         errors = []
 
         # Count JOINs
-        join_count = self._count_joins(statement)
+        join_count = analysis['join_count']
         if join_count > self.max_joins:
             errors.append(
                 f"Too many JOINs: {join_count} (max allowed: {self.max_joins})"
             )
 
         # Count subquery depth
-        subquery_depth = self._count_subquery_depth(statement)
+        subquery_depth = analysis['subquery_depth']
         if subquery_depth > self.max_subquery_depth:
             errors.append(
                 f"Subquery nesting too deep: {subquery_depth} "
@@ -97,41 +297,65 @@ class SQLValidator:
 
         return errors
 
-    def _count_joins(self, statement) -> int:
-        """Count number of JOINs in query"""
-        join_count = 0
-        sql_str = str(statement).upper()
-
-        # Count different types of joins
-        join_patterns = [
-            r'\bINNER\s+JOIN\b',
-            r'\bLEFT\s+JOIN\b',
-            r'\bRIGHT\s+JOIN\b',
-            r'\bFULL\s+JOIN\b',
-            r'\bCROSS\s+JOIN\b',
-            r'\bJOIN\b'
-        ]
+    def _count_joins(self, sql_upper: str) -> int:
+        """Count number of JOINs in the upper-cased SQL"""
+        return len(_JOIN_RE.findall(sql_upper))
 
-        for pattern in join_patterns:
-            join_count += len(re.findall(pattern, sql_str))
+    def _subquery_depth(self, statement, sql_upper: str) -> int:
+        """
+        Maximum subquery nesting depth, from a scan of the SQL text
 
-        return join_count
+        Counts nested '(SELECT' openings, skipping quoted strings and
+        identifiers. Falls back to walking the parse tree if the
+        parentheses don't balance.
+        """
+        depth = 0
+        max_depth = 0
+        # Per open parenthesis: whether it started a subquery
+        stack = []
+
+        for match in _PAREN_SCAN_RE.finditer(sql_upper):
+            if match.group('open') is not None:
+                is_subquery = match.group('select') is not None
+                stack.append(is_subquery)
+                if is_subquery:
+                    depth += 1
+                    max_depth = max(max_depth, depth)
+            elif match.group('close') is not None:
+                if not stack:
+                    return self._count_subquery_depth(statement)
+                if stack.pop():
+                    depth -= 1
+
+        if stack:
+            return self._count_subquery_depth(statement)
+        return max_depth
 
-    def _count_subquery_depth(self, statement, current_depth=0) -> int:
-        """Recursively count maximum subquery nesting depth"""
-        max_depth = current_depth
+    def _count_subquery_depth(self, statement) -> int:
+        """
+        Count maximum subquery nesting depth
 
-        for token in statement.tokens:
-            if token.ttype is None:
-                # Check if it's a subquery (parenthesized statement)
-                if hasattr(token, 'tokens'):
-                    token_str = str(token).strip()
-                    if token_str.startswith('(') and 'SELECT' in token_str.upper():
-                        depth = self._count_subquery_depth(token, current_depth + 1)
-                        max_depth = max(max_depth, depth)
-                    else:
-                        depth = self._count_subquery_depth(token, current_depth)
-                        max_depth = max(max_depth, depth)
+        Walks the parse tree with an explicit stack; a parenthesized group
+        with a SELECT anywhere inside it opens a level. Tokens are inspected
+        by type, never stringified.
+        """
+        max_depth = 0
+        stack = [(statement, 0)]
+
+        while stack:
+            token, depth = stack.pop()
+            for child in token.tokens:
+                if child.ttype is not None or not child.is_group:
+                    continue
+                first = child.tokens[0] if child.tokens else None
+                if (first is not None and first.ttype is Punctuation and first.value == '('
+                        and any(t.ttype is DML and t.normalized == 'SELECT'
+                                for t in child.flatten())):
+                    child_depth = depth + 1
+                    max_depth = max(max_depth, child_depth)
+                else:
+                    child_depth = depth
+                stack.append((child, child_depth))
 
         return max_depth
 
@@ -145,7 +369,7 @@ class SQLValidator:
 
             # Validate tables
             for table in tables:
-                if table not in self.schema_info:
+                if table not in self._table_cols:
                     errors.append(f"Table '{table}' not found in schema")
 
             # Extract columns
@@ -153,19 +377,14 @@ class SQLValidator:
 
             # Validate columns
             for table, column in columns:
-                if table and table in self.schema_info:
-                    if column not in self.schema_info[table]['columns']:
+                if table and table in self._table_cols:
+                    if column not in self._table_cols[table]:
                         errors.append(
                             f"Column '{column}' not found in table '{table}'"
                         )
                 elif not table:
                     # Column without table qualifier - check all tables
-                    found = False
-                    for tbl_name, tbl_info in self.schema_info.items():
-                        if column in tbl_info['columns']:
-                            found = True
-                            break
-                    if not found:
+                    if column not in self._col_to_tables:
                         errors.append(f"Column '{column}' not found in any table")
 
         except Exception as e:
@@ -205,7 +424,7 @@ class SQLValidator:
         """Extract table name from identifier"""
         name = identifier.get_real_name()
         if name:
-            return name.strip('`"[]')
+            return name.translate(_QUOTE_TRANS)
         return None
 
     def _extract_columns(self, statement) -> List[Tuple[str, str]]:
@@ -235,80 +454,127 @@ class SQLValidator:
         """Parse identifier to extract table and column name"""
         name = str(identifier)
 
-        # Handle table.column format
-        if '.' in name:
-            parts = name.split('.')
-            if len(parts) == 2:
-                table = parts[0].strip('`"[]')
-                column = parts[1].strip('`"[]')
-                return (table, column)
+        # Handle table.column format (anything with more dots is skipped)
+        table, dot, column = name.partition('.')
+        if dot:
+            if '.' not in column:
+                return (table.translate(_QUOTE_TRANS), column.translate(_QUOTE_TRANS))
         else:
             # Column without table
-            column = name.strip('`"[]')
+            column = name.translate(_QUOTE_TRANS)
             # Filter out keywords and functions
-            if column.upper() not in ['SELECT', 'FROM', 'WHERE', 'AS', '*']:
+            if column.upper() not in _SQL_KEYWORDS:
                 return (None, column)
 
         return None
 
-    def _check_dangerous_patterns(self, sql_query: str) -> List[str]:
+    def _check_dangerous_patterns(self, sql_query: str, sql_upper: str = None) -> List[str]:
         """Check for potentially dangerous SQL patterns"""
         errors = []
-        sql_upper = sql_query.upper()
+        if sql_upper is None:
+            sql_upper = sql_query.upper()
 
         # Check for multiple statements
         if ';' in sql_query[:-1]:  # Allow trailing semicolon
             errors.append("Multiple SQL statements not allowed")
 
         # Check for SQL injection patterns
-        dangerous_patterns = [
-            (r'--', "SQL comments not allowed"),
-            (r'/\*', "Multi-line comments not allowed"),
-            (r'\bEXEC\b', "EXEC command not allowed"),
-            (r'\bEXECUTE\b', "EXECUTE command not allowed"),
-            (r'\bINTO\s+OUTFILE\b', "INTO OUTFILE not allowed"),
-            (r'\bLOAD_FILE\b', "LOAD_FILE not allowed"),
-        ]
-
-        for pattern, message in dangerous_patterns:
-            if re.search(pattern, sql_upper):
+        for literal, message in _DANGER_LITERALS:
+            if literal in sql_query:
                 errors.append(message)
 
+        if any(word in sql_upper for word in _DANGER_WORDS):
+            found = {match.lastgroup for match in _DANGER_RE.finditer(sql_upper)}
+            for group, message in _DANGER_MESSAGES:
+                if group in found:
+                    errors.append(message)
+
         return errors
 
     def estimate_cost(self, sql_query: str) -> Dict:
         """
         Estimate query cost/complexity
 
+        Cached the same way as validate().
+
         Returns:
             Dictionary with cost metrics
         """
+        cost = self._cache_get(self._cost_cache, sql_query)
+        if cost is None:
+            cost = self._estimate_cost(sql_query)
+            self._cache_put(self._cost_cache, sql_query, cost)
+        return dict(cost)
+
+    def _estimate_cost(self, sql_query: str) -> Dict:
+        """Uncached estimate_cost()"""
         try:
-            parsed = sqlparse.parse(sql_query)[0]
+            parsed = self._parse(sql_query)
+            analysis = self._analyze(
+                parsed[0], sql_query.upper() if len(parsed) == 1 else None
+            )
 
             return {
-                'join_count': self._count_joins(parsed),
-                'subquery_depth': self._count_subquery_depth(parsed),
-                'has_aggregation': 'GROUP BY' in sql_query.upper(),
-                'has_order': 'ORDER BY' in sql_query.upper(),
-                'estimated_complexity': self._calculate_complexity_score(parsed)
+                'join_count': analysis['join_count'],
+                'subquery_depth': analysis['subquery_depth'],
+                'has_aggregation': analysis['has_aggregation'],
+                'has_order': analysis['has_order'],
+                'estimated_complexity': self._calculate_complexity_score(analysis)
             }
         except:
             return {'estimated_complexity': 0}
 
-    def _calculate_complexity_score(self, statement) -> int:
-        """Calculate a simple complexity score"""
+    def _calculate_complexity_score(self, analysis: Dict) -> int:
+        """Calculate a simple complexity score (analysis from _analyze())"""
         score = 1  # Base score
 
-        score += self._count_joins(statement) * 2
-        score += self._count_subquery_depth(statement) * 3
+        score += analysis['join_count'] * 2
+        score += analysis['subquery_depth'] * 3
 
-        sql_str = str(statement).upper()
-        if 'GROUP BY' in sql_str:
+        if analysis['has_aggregation']:
             score += 2
-        if 'ORDER BY' in sql_str:
+        if analysis['has_order']:
             score += 1
-        if 'DISTINCT' in sql_str:
+        if analysis['has_distinct']:
             score += 1
 
         return score
+
+
+# Worker processes shared by every validator's validate_batch()
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def _get_batch_pool() -> ProcessPoolExecutor:
+    """
+    Get or create the validate_batch() worker pool
+
+    Workers are spawned rather than forked, so they don't inherit the
+    server's threads, held locks or loaded model.
+    """
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count(),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _batch_pool
+
+
+def _discard_batch_pool():
+    """Drop a broken pool so the next large batch starts a fresh one"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is not None:
+            _batch_pool.shutdown(wait=False)
+            _batch_pool = None
+
+
+def _validate_chunk_in_worker(schema_info: Dict,
+                              queries: List[str]) -> List[Tuple[bool, List[str]]]:
+    # The pool outlives any one schema, so each task carries its own
+    validator = SQLValidator(schema_info)
+    return [validator._validate(sql_query) for sql_query in queries]